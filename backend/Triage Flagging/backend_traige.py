@@ -7,22 +7,41 @@ import os
 import warnings
 import openai
 import json
+import time
+import threading
 import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime
 warnings.filterwarnings('ignore')
 
+# Narrative jobs kept for polling before the oldest finished ones are dropped
+NARRATIVE_JOB_LIMIT = 1000
+
 class TriageAIAgent:
     def __init__(self, model_path="/Users/krishilparikh/Synergy/backend/Triage Flagging/triage_priority_model.h5", 
                 encoders_path="/Users/krishilparikh/Synergy/backend/Triage Flagging/label_encoders.pkl", 
                 scaler_path="/Users/krishilparikh/Synergy/backend/Triage Flagging/scaler.pkl",
-                api_key=None):
+                api_key=None, fast_path=True, schema_path=None, narrative_workers=4):
         """Initialize the Triage AI Agent with necessary models and encoders"""
         self.model = load_model(model_path)
+        
+        # Single-row inference goes through a compiled graph unless fast_path=False
+        self.infer_fn = None
+        self.n_features = self.model.input_shape[1]
+        if fast_path:
+            self.compile_fast_path()
         with open(encoders_path, 'rb') as f:
             self.label_encoders = pickle.load(f)
         with open(scaler_path, 'rb') as f:
             self.scaler = pickle.load(f)
         
+        # LLM narratives are generated in the background and polled by job id
+        self.narrative_pool = ThreadPoolExecutor(max_workers=narrative_workers, thread_name_prefix='narrative')
+        self.narrative_jobs = OrderedDict()
+        self.narrative_lock = threading.Lock()
+        
         # Set up OpenAI with enhanced debugging - using old API syntax
         try:
             # Use provided API key or get from environment
@@ -113,6 +132,168 @@ class TriageAIAgent:
                 1: "Delayed", 
                 2: "Urgent"
             }
+        
+        # Feature layout persisted next to the model, loaded once
+        self.schema_path = schema_path or f"{os.path.splitext(model_path)[0]}.schema.json"
+        self.feature_schema = self.load_feature_schema(self.schema_path)
+        
+        # Flat lookup tables for encoding a patient straight into the model's input buffer
+        self.compile_encoding_tables()
+    
+    def build_feature_schema(self):
+        """Derive the feature layout the model was trained on.
+        
+        Training used the dataset columns in file order without the target, i.e. the
+        required fields followed by 'Time of Arrival'. Arrival times cannot be encoded
+        for new patients, so that feature (and any further model input) is a constant 0.
+        """
+        n_features = self.n_features
+        if n_features < len(self.required_fields):
+            raise ValueError(f"Model expects {n_features} features but there are {len(self.required_fields)} "
+                             f"required fields; provide a feature schema")
+        
+        features = list(self.required_fields)
+        dtypes = {field: 'categorical' if field in self.categorical_fields else 'numerical' for field in features}
+        for name in (['Time of Arrival'] + [f'padding_{i}' for i in range(n_features)])[:n_features - len(features)]:
+            features.append(name)
+            dtypes[name] = 'constant'
+        
+        scaler_features = [str(field) for field in getattr(self.scaler, 'feature_names_in_', self.numerical_fields)]
+        return {
+            'n_features': n_features,
+            'features': features,
+            'dtypes': dtypes,
+            'constants': {name: 0.0 for name, kind in dtypes.items() if kind == 'constant'},
+            'scaler_features': scaler_features,
+            'scaler_indices': [features.index(field) for field in scaler_features]
+        }
+    
+    def load_feature_schema(self, schema_path):
+        """Load the feature schema, deriving and saving it on first use"""
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                schema = json.load(f)
+        else:
+            schema = self.build_feature_schema()
+            try:
+                with open(schema_path, 'w') as f:
+                    json.dump(schema, f, indent=2)
+                print(f"Saved feature schema to {schema_path}")
+            except OSError as e:
+                print(f"Warning: Could not save feature schema to {schema_path}: {str(e)}")
+        
+        # Refuse to run with a layout that does not match the model or the scaler
+        features = schema['features']
+        if len(features) != schema['n_features'] or schema['n_features'] != self.n_features:
+            raise ValueError(f"Feature schema has {len(features)} features but model expects "
+                             f"{self.n_features}")
+        scaler_features = [str(field) for field in getattr(self.scaler, 'feature_names_in_', schema['scaler_features'])]
+        if scaler_features != schema['scaler_features'] or \
+                [features[i] for i in schema['scaler_indices']] != scaler_features:
+            raise ValueError("Feature schema scaler columns do not match the scaler")
+        unknown = [field for field, kind in schema['dtypes'].items()
+                   if kind == 'categorical' and field not in self.categorical_fields]
+        if unknown:
+            raise ValueError(f"Feature schema has categorical features without encoders: {unknown}")
+        return schema
+    
+    def compile_encoding_tables(self):
+        """Compile the label encoders, valid values and scaler into per-field lookup tables.
+        
+        encoding_tables maps every valid value of a categorical field to its encoder
+        code. Valid values the encoder never saw during training are encoded as
+        unknown_code (0, the first class) and reported once here instead of on every
+        request. Numerical fields the scaler was fitted on get their mean and scale at
+        the field's position in feature_order.
+        """
+        self.unknown_code = 0
+        self.encoding_tables = {}
+        for field in self.categorical_fields:
+            classes = self.label_encoders[field].classes_ if field in self.label_encoders else []
+            table = {value: code for code, value in enumerate(classes)}
+            valid = self.valid_values.get(field, list(table))
+            unseen = [value for value in valid if value not in table]
+            if unseen:
+                print(f"Warning: {field} values {unseen} were not seen in training. Encoding them as {self.unknown_code}.")
+            self.encoding_tables[field] = {value: float(table.get(value, self.unknown_code)) for value in valid}
+        
+        # Input features in schema order; constant features are preset in every row
+        schema = self.feature_schema
+        self.feature_order = schema['features']
+        self.feature_index = {field: i for i, field in enumerate(self.feature_order)}
+        self.input_features = [(i, field) for i, field in enumerate(self.feature_order)
+                               if schema['dtypes'][field] != 'constant']
+        self.unmodeled_fields = [field for field in self.required_fields if field not in self.feature_index]
+        
+        n_features = len(self.feature_order)
+        self.constant_values = np.zeros(n_features, dtype=np.float32)
+        for field, value in schema['constants'].items():
+            self.constant_values[self.feature_index[field]] = value
+        
+        self.scale_mean = np.zeros(n_features, dtype=np.float32)
+        self.scale_scale = np.ones(n_features, dtype=np.float32)
+        self.scale_mean[schema['scaler_indices']] = self.scaler.mean_
+        self.scale_scale[schema['scaler_indices']] = self.scaler.scale_
+    
+    def encode_input(self, user_input):
+        """Validate a patient and encode it into a (1, n_features) float32 array in one pass.
+        
+        Returns (features, missing_fields, invalid_values) with the same validation
+        rules as validate_batch: validate_input's, plus None and NaN counting as
+        missing (Known Allergies and Medication History default to 'None'). features
+        is only usable when both are empty. Each call gets its own array, so
+        concurrent requests never share one.
+        """
+        row = self.constant_values[None, :].copy()
+        features = row[0]
+        missing_fields = []
+        invalid_values = {}
+        
+        for i, field in self.input_features:
+            value = user_input.get(field)
+            if isinstance(value, float) and value != value:
+                # NaN, e.g. from a DataFrame row, counts as missing
+                value = None
+            if value is None and field in ('Known Allergies', 'Medication History'):
+                value = "None"
+            if value is None or value == "":
+                missing_fields.append(field)
+                continue
+            
+            table = self.encoding_tables.get(field)
+            if table is not None:
+                code = table.get(value)
+                if code is None:
+                    invalid_values[field] = value
+                else:
+                    features[i] = code
+            else:
+                try:
+                    number = float(value)
+                except (TypeError, ValueError):
+                    invalid_values[field] = value
+                    continue
+                if number != number:
+                    missing_fields.append(field)
+                else:
+                    features[i] = number
+        
+        # Required fields that are not model features
+        for field in self.unmodeled_fields:
+            if user_input.get(field) in (None, ""):
+                missing_fields.append(field)
+        
+        features -= self.scale_mean
+        features /= self.scale_scale
+        return row, missing_fields, invalid_values
+    
+    def predict_features(self, features):
+        """Predict triage priority from an encoded (1, n_features) float32 array"""
+        if self.infer_fn is None:
+            prediction = self.model.predict(features, verbose=0)
+        else:
+            prediction = self.infer_fn(features).numpy()
+        return self.prediction_result(prediction[0])
     
     def validate_input(self, user_input):
         """Validate user input for required fields and valid values"""
@@ -140,36 +321,87 @@ class TriageAIAgent:
         
         return missing_fields, invalid_values
     
+    def validate_batch(self, patients):
+        """Validate a DataFrame of patients column by column; returns one (missing_fields, invalid_values) pair per row"""
+        missing_fields = [[] for _ in range(len(patients))]
+        invalid_values = [{} for _ in range(len(patients))]
+        patients = patients.fillna({field: "None" for field in ['Known Allergies', 'Medication History']
+                                    if field in patients.columns})
+        
+        # Check for missing fields
+        for field in self.required_fields:
+            if field not in patients.columns:
+                for row in missing_fields:
+                    row.append(field)
+                continue
+            for i in np.flatnonzero((patients[field].isna() | (patients[field] == "")).to_numpy()).tolist():
+                missing_fields[i].append(field)
+        
+        # Check for valid values in categorical fields, then for numbers in numerical fields
+        for field in self.categorical_fields + self.numerical_fields:
+            if field not in patients.columns:
+                continue
+            values = patients[field]
+            present = (values.notna() & (values != "")).to_numpy()
+            if field in self.categorical_fields:
+                if field not in self.valid_values:
+                    continue
+                invalid = present & ~values.isin(self.valid_values[field]).to_numpy()
+            else:
+                invalid = present & pd.to_numeric(values, errors='coerce').isna().to_numpy()
+            for i in np.flatnonzero(invalid).tolist():
+                invalid_values[i][field] = values.iloc[i]
+        
+        return list(zip(missing_fields, invalid_values))
+    
+    def validation_message(self, missing_fields, invalid_values):
+        """Describe validation problems for the user"""
+        response = "Please correct the following issues:\n"
+        if missing_fields:
+            response += f"\nMissing required fields: {', '.join(missing_fields)}\n"
+        if invalid_values:
+            response += "\nInvalid values:\n"
+            for field, value in invalid_values.items():
+                response += f"- {field}: '{value}' is not valid. "
+                if field in self.valid_values:
+                    response += f"Valid options are: {', '.join(self.valid_values[field])}\n"
+                else:
+                    response += "Should be a number.\n"
+        return response
+    
     def preprocess_input(self, user_input):
         """Preprocess user input to match the model's expected format"""
-        # Create a dataframe with user input
-        df = pd.DataFrame([user_input])
+        return self.preprocess_batch(pd.DataFrame([user_input]))
+    
+    def preprocess_batch(self, patients):
+        """Preprocess a DataFrame of patients to match the model's expected format"""
+        df = patients.reset_index(drop=True)
         
         # Handle missing values
-        df['Known Allergies'].fillna("None", inplace=True)
-        df['Medication History'].fillna("None", inplace=True)
+        for field in ['Known Allergies', 'Medication History']:
+            if field in df.columns:
+                df[field] = df[field].fillna("None")
         
         # Convert numerical values
         for field in self.numerical_fields:
             if field in df.columns:
                 df[field] = pd.to_numeric(df[field], errors='coerce')
         
-        # Encode categorical variables using saved encoders
+        # Encode categorical variables through the compiled lookup tables
         for col in self.categorical_fields:
-            if col in df.columns and col in self.label_encoders:
-                try:
-                    df[col] = self.label_encoders[col].transform(df[col])
-                except:
-                    # Handle unseen categories by using the most common category
-                    print(f"Warning: Could not transform {col}. Using default value.")
-                    df[col] = 0  # Default to first category
-        
-        # Apply scaling to numerical features
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        if not numeric_cols.empty:
+            if col in df.columns:
+                codes = df[col].map(self.encoding_tables[col])
+                unknown = codes.isna()
+                if unknown.any():
+                    print(f"Warning: Unknown {col} for {unknown.sum()} patient(s). Using default value.")
+                df[col] = codes.fillna(self.unknown_code)
+        
+        # Apply scaling to the numerical features the scaler was fitted on
+        scaled_cols = [col for col in self.feature_schema['scaler_features'] if col in df.columns]
+        if scaled_cols:
             try:
-                df[numeric_cols] = self.scaler.transform(df[numeric_cols])
-            except:
+                df[scaled_cols] = self.scaler.transform(df[scaled_cols])
+            except Exception:
                 print("Warning: Scaling error. Some numeric features might be out of range.")
                 # Proceed anyway - the model should be robust to some scaling issues
             
@@ -179,34 +411,22 @@ class TriageAIAgent:
         
         return df
     
-    def predict_triage(self, preprocessed_data):
-        """Predict triage priority using the loaded ML model"""
-        # Drop any columns that might not be needed for prediction
-        if 'Triage Priority' in preprocessed_data.columns:
-            preprocessed_data = preprocessed_data.drop(columns=['Triage Priority'])
-        if 'Time of Arrival' in preprocessed_data.columns:
-            preprocessed_data = preprocessed_data.drop(columns=['Time of Arrival'])
-            
-        # Get feature names from the model input
-        model_features = self.model.input_shape[1]
-        
-        # Check if we need to drop additional columns
-        # This handles the case where feature selection was done during training
-        if len(preprocessed_data.columns) > model_features:
-            print(f"Warning: Input has {len(preprocessed_data.columns)} features but model expects {model_features}.")
-            # Keep only the first model_features columns
-            # This is a simplistic approach - ideally, you'd know exactly which features were used
-            preprocessed_data = preprocessed_data.iloc[:, :model_features]
-        elif len(preprocessed_data.columns) < model_features:
-            print(f"Warning: Input has {len(preprocessed_data.columns)} features but model expects {model_features}.")
-            # Add dummy columns filled with zeros
-            for i in range(model_features - len(preprocessed_data.columns)):
-                preprocessed_data[f'dummy_{i}'] = 0
-            
-        # Make prediction
-        prediction = self.model.predict(preprocessed_data)
-        predicted_class = np.argmax(prediction, axis=1)[0]
-        confidence = np.max(prediction) * 100
+    def model_input(self, preprocessed_data):
+        """Arrange preprocessed columns in the schema's feature order as a float32 array"""
+        missing = [field for _, field in self.input_features if field not in preprocessed_data.columns]
+        if missing:
+            raise ValueError(f"Preprocessed data is missing model features: {missing}")
+        
+        features = np.empty((len(preprocessed_data), len(self.feature_order)), dtype=np.float32)
+        features[:] = self.constant_values
+        for i, field in self.input_features:
+            features[:, i] = preprocessed_data[field].to_numpy(dtype=np.float32)
+        return features
+    
+    def prediction_result(self, probabilities):
+        """Turn one row of model output into a priority, confidence and class probabilities"""
+        predicted_class = int(np.argmax(probabilities))
+        confidence = float(np.max(probabilities)) * 100
         
         # Map to priority name using the correct mapping
         priority = self.priority_mapping.get(predicted_class, "Unknown")
@@ -215,12 +435,79 @@ class TriageAIAgent:
             'priority': priority,
             'confidence': confidence,
             'probabilities': {
-                'Immediate': float(prediction[0][0]) * 100,
-                'Urgent': float(prediction[0][1]) * 100,
-                'Delayed': float(prediction[0][2]) * 100
+                'Immediate': float(probabilities[0]) * 100,
+                'Urgent': float(probabilities[1]) * 100,
+                'Delayed': float(probabilities[2]) * 100
             }
         }
     
+    def compile_fast_path(self):
+        """Trace the model once into a tf.function with a fixed single-row float32 signature.
+        
+        Calling it skips Keras predict's per-call data adapter and tf.data setup, which
+        dominate the cost of scoring one patient.
+        """
+        model = self.model
+        
+        @tf.function(input_signature=[tf.TensorSpec(shape=(1, self.n_features), dtype=tf.float32)])
+        def infer(features):
+            return model(features, training=False)
+        
+        try:
+            # Trace now so the first patient does not pay for it
+            infer(np.zeros((1, self.n_features), dtype=np.float32))
+            self.infer_fn = infer
+        except Exception as e:
+            print(f"Warning: Could not compile fast inference path, using model.predict: {str(e)}")
+            self.infer_fn = None
+    
+    def predict_triage(self, preprocessed_data):
+        """Predict triage priority using the loaded ML model"""
+        return self.predict_features(self.model_input(preprocessed_data)[:1])
+    
+    def predict_triage_batch(self, preprocessed_data, batch_size=256):
+        """Predict triage priorities for every preprocessed row with one model call"""
+        prediction = self.model.predict(self.model_input(preprocessed_data), batch_size=batch_size, verbose=0)
+        return [self.prediction_result(row) for row in prediction]
+    
+    def benchmark_latency(self, user_input, runs=200, warmup=10):
+        """Time preprocessing plus prediction of one patient along each inference path.
+        
+        'dataframe' is the DataFrame preprocessing with model.predict, 'tables' the
+        lookup-table encoding with model.predict and 'tables_compiled' the lookup-table
+        encoding with the compiled graph (when available). Returns p50/p99/mean
+        latency in milliseconds per path.
+        """
+        # Each path calls its predictor directly, self.infer_fn is never swapped
+        def predict(features):
+            return self.prediction_result(self.model.predict(features, verbose=0)[0])
+        
+        paths = {
+            'dataframe': lambda: predict(self.model_input(self.preprocess_input(user_input))[:1]),
+            'tables': lambda: predict(self.encode_input(user_input)[0])
+        }
+        compiled = self.infer_fn
+        if compiled is not None:
+            paths['tables_compiled'] = lambda: self.prediction_result(
+                compiled(self.encode_input(user_input)[0]).numpy()[0])
+        
+        results = {}
+        for name, run in paths.items():
+            for _ in range(warmup):
+                run()
+            timings = np.empty(runs)
+            for i in range(runs):
+                start = time.perf_counter()
+                run()
+                timings[i] = (time.perf_counter() - start) * 1000
+            results[name] = {
+                'p50_ms': float(np.percentile(timings, 50)),
+                'p99_ms': float(np.percentile(timings, 99)),
+                'mean_ms': float(timings.mean()),
+                'runs': runs
+            }
+        return results
+    
     def generate_openai_response(self, user_input, prediction):
         """Generate a response using OpenAI's GPT-3.5 Turbo model with enhanced debugging"""
         print("\n--- STARTING OPENAI RESPONSE GENERATION ---")
@@ -331,6 +618,80 @@ class TriageAIAgent:
         finally:
             print("--- FINISHED OPENAI RESPONSE GENERATION ---\n")
     
+    def submit_narrative(self, user_input, prediction, callback=None):
+        """Start generating the LLM narrative in the background and return its job id.
+        
+        Until the job finishes, get_narrative returns the generate_fallback_response
+        template as the response. callback(job_id, response) is called from the
+        worker thread once the narrative is ready.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'pending',
+            'response': self.generate_fallback_response(user_input, prediction),
+            'submitted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'completed_at': None
+        }
+        with self.narrative_lock:
+            self.narrative_jobs[job_id] = job
+            # Drop the oldest finished jobs beyond the limit
+            finished = [key for key, old in self.narrative_jobs.items() if old['status'] != 'pending']
+            for key in finished[:max(0, len(self.narrative_jobs) - NARRATIVE_JOB_LIMIT)]:
+                del self.narrative_jobs[key]
+            job['future'] = self.narrative_pool.submit(self.run_narrative, job_id, dict(user_input), prediction,
+                                                       callback)
+        return job_id
+    
+    def run_narrative(self, job_id, user_input, prediction, callback=None):
+        """Worker: generate one narrative and store it on its job"""
+        try:
+            response = self.generate_openai_response(user_input, prediction)
+            status = 'complete'
+        except Exception as e:
+            print(f"Error generating narrative for job {job_id}: {str(e)}")
+            response, status = None, 'failed'
+        
+        with self.narrative_lock:
+            job = self.narrative_jobs.get(job_id)
+            if job is not None:
+                if response is not None:
+                    job['response'] = response
+                job['status'] = status
+                job['completed_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                response = job['response']
+        
+        if callback is not None:
+            try:
+                callback(job_id, response)
+            except Exception as e:
+                print(f"Error in narrative callback for job {job_id}: {str(e)}")
+        return response
+    
+    def get_narrative(self, job_id, timeout=None):
+        """Poll a narrative job; with timeout, wait up to that many seconds for it to finish.
+        
+        Returns the job's status ('pending', 'complete' or 'failed'), its response
+        (the fallback template while pending or failed) and timestamps.
+        """
+        with self.narrative_lock:
+            job = self.narrative_jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown narrative job '{job_id}'")
+        
+        if timeout is not None and job['status'] == 'pending':
+            try:
+                job['future'].result(timeout=timeout)
+            except TimeoutError:
+                pass
+        
+        with self.narrative_lock:
+            return {key: value for key, value in job.items() if key != 'future'}
+    
+    def shutdown(self, wait=True):
+        """Stop the narrative worker pool"""
+        self.narrative_pool.shutdown(wait=wait)
+    
     def generate_fallback_response(self, user_input, prediction):
         """Generate a fallback response when OpenAI is unavailable"""
         # Extract key information
@@ -419,57 +780,107 @@ Note: Patient should be instructed to notify staff immediately if symptoms worse
         
         return response
     
-    def process(self, user_input):
-        """Process user input through the entire pipeline with enhanced debugging"""
+    def process(self, user_input, async_response=True, callback=None):
+        """Process user input through the entire pipeline with enhanced debugging.
+        
+        With async_response=True (the default) and OpenAI available, the prediction is
+        returned as soon as it is made: 'response' holds the fallback template,
+        'response_status' is 'pending' and the narrative is generated in the background
+        under 'narrative_job_id' (poll get_narrative, or pass callback(job_id, response)).
+        Otherwise the response is generated before returning.
+        """
         print("\n=== STARTING TRIAGE PROCESS ===")
-        # Step 1: Validate input
-        print("Validating input...")
-        missing_fields, invalid_values = self.validate_input(user_input)
+        # Steps 1-2: Validate and encode input in one pass
+        print("Validating and encoding input...")
+        features, missing_fields, invalid_values = self.encode_input(user_input)
         
         if missing_fields or invalid_values:
-            response = "Please correct the following issues:\n"
-            if missing_fields:
-                response += f"\nMissing required fields: {', '.join(missing_fields)}\n"
-            if invalid_values:
-                response += "\nInvalid values:\n"
-                for field, value in invalid_values.items():
-                    response += f"- {field}: '{value}' is not valid. "
-                    if field in self.valid_values:
-                        response += f"Valid options are: {', '.join(self.valid_values[field])}\n"
-                    else:
-                        response += "Should be a number.\n"
             print("Input validation failed.")
-            return {"status": "error", "message": response}
+            return {"status": "error", "message": self.validation_message(missing_fields, invalid_values)}
         
         print("Input validation successful.")
         
         try:
-            # Step 2: Preprocess input
-            print("Preprocessing input...")
-            preprocessed_data = self.preprocess_input(user_input)
-            print("Input preprocessing complete.")
-            
             # Step 3: Predict triage priority
             print("Predicting triage priority...")
-            prediction = self.predict_triage(preprocessed_data)
+            prediction = self.predict_features(features)
             print(f"Triage prediction: {prediction['priority']} with {prediction['confidence']:.1f}% confidence.")
             
             # Step 4: Generate response using OpenAI
-            print("Generating response...")
-            llm_response = self.generate_openai_response(user_input, prediction)
-            print("Response generation complete.")
+            result = {"status": "success", "triage_prediction": prediction}
+            if async_response and self.openai_available:
+                print("Submitting response generation...")
+                job_id = self.submit_narrative(user_input, prediction, callback)
+                narrative = self.get_narrative(job_id)
+                result.update(response=narrative['response'], response_status=narrative['status'],
+                              narrative_job_id=job_id)
+            else:
+                print("Generating response...")
+                result.update(response=self.generate_openai_response(user_input, prediction),
+                              response_status='complete')
+                print("Response generation complete.")
             
             print("=== TRIAGE PROCESS COMPLETED SUCCESSFULLY ===\n")
-            return {
-                "status": "success",
-                "triage_prediction": prediction,
-                "response": llm_response
-            }
+            return result
         except Exception as e:
             print(f"Error in process method: {str(e)}")
             print(f"Detailed error: {traceback.format_exc()}")
             print("=== TRIAGE PROCESS FAILED ===\n")
             return {"status": "error", "message": f"An error occurred: {str(e)}"}
+    
+    def process_batch(self, patients, response='fallback', batch_size=256):
+        """Process many patients (DataFrame or list of dicts) with one batched model call.
+        
+        Returns one result per patient in input order, each shaped like the result of
+        process() plus the patient's 'index'. Patients that fail validation get their
+        own error result and do not hold up the rest. response selects the text per
+        patient: 'fallback' (template), 'openai' (template now, LLM narrative in the
+        background as with process()) or None.
+        """
+        if response not in ('fallback', 'openai', None):
+            raise ValueError(f"Unknown response mode '{response}', expected 'fallback', 'openai' or None")
+        
+        patients = patients if isinstance(patients, pd.DataFrame) else pd.DataFrame(list(patients))
+        print(f"\n=== STARTING BATCH TRIAGE PROCESS ({len(patients)} patients) ===")
+        results = [None] * len(patients)
+        
+        # Step 1: Validate every patient, keeping the valid rows for prediction
+        valid_rows = []
+        for i, (missing_fields, invalid_values) in enumerate(self.validate_batch(patients)):
+            if missing_fields or invalid_values:
+                results[i] = {"index": patients.index[i], "status": "error",
+                              "message": self.validation_message(missing_fields, invalid_values)}
+            else:
+                valid_rows.append(i)
+        print(f"Input validation: {len(valid_rows)} valid, {len(patients) - len(valid_rows)} invalid.")
+        
+        if valid_rows:
+            valid = patients.iloc[valid_rows]
+            try:
+                # Steps 2-3: Preprocess and predict all valid patients at once
+                predictions = self.predict_triage_batch(self.preprocess_batch(valid), batch_size=batch_size)
+            except Exception as e:
+                print(f"Error in process_batch method: {str(e)}")
+                print(f"Detailed error: {traceback.format_exc()}")
+                for i in valid_rows:
+                    results[i] = {"index": patients.index[i], "status": "error",
+                                  "message": f"An error occurred: {str(e)}"}
+                print("=== BATCH TRIAGE PROCESS FAILED ===\n")
+                return results
+            
+            # Step 4: Per-patient response text
+            for i, user_input, prediction in zip(valid_rows, valid.to_dict('records'), predictions):
+                result = {"index": patients.index[i], "status": "success", "triage_prediction": prediction}
+                if response == 'openai' and self.openai_available:
+                    job_id = self.submit_narrative(user_input, prediction)
+                    result.update(response=self.get_narrative(job_id)['response'], response_status='pending',
+                                  narrative_job_id=job_id)
+                elif response in ('openai', 'fallback'):
+                    result["response"] = self.generate_fallback_response(user_input, prediction)
+                results[i] = result
+        
+        print("=== BATCH TRIAGE PROCESS COMPLETED ===\n")
+        return results
 
 
 # Additional testing code for the main block
@@ -545,6 +956,9 @@ if __name__ == "__main__":
             print(f"Predicted Triage Priority: {result['triage_prediction']['priority']}")
             print(f"Confidence: {result['triage_prediction']['confidence']:.2f}%")
             print("\nDetailed Response:")
+            if result.get("narrative_job_id"):
+                # The prediction came back first; wait for the narrative for the demo
+                result["response"] = agent.get_narrative(result["narrative_job_id"], timeout=60)["response"]
             print(result["response"])
         else:
             print(f"Error: {result['message']}")
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pulp as pl
+
+from resource_alloc import HealthcareResourceAllocator
+
+REGIONS = ["North", "South", "East", "West"]
+
+
+# Phases of run_full_allocation timed by benchmark_phases, in run order
+PHASES = ['load', 'preprocess', 'build', 'solve', 'extract', 'supplier', 'report', 'writeback']
+
+
+def generate_synthetic_data(n_patients, n_hospitals=20, seed=42, n_suppliers=5):
+    """Generate reproducible synthetic patients, hospitals and suppliers with the real column names."""
+    rng = np.random.default_rng(seed)
+
+    arrival = pd.Timestamp('2025-03-01') + pd.to_timedelta(rng.integers(0, 24 * 60, n_patients), unit='min')
+    patients_df = pd.DataFrame({
+        'Patient ID': np.arange(1, n_patients + 1),
+        'Patient Name': [f"Patient {i}" for i in range(1, n_patients + 1)],
+        'Triage Priority': rng.integers(1, 6, n_patients),
+        'MEWS_Score': rng.integers(0, 10, n_patients),
+        'Time_Criticality_Min': rng.choice([60, 120, 240], n_patients),
+        'Region': rng.choice(REGIONS, n_patients, p=[0.4, 0.2, 0.2, 0.2]),
+        'Time of Arrival': arrival.strftime('%Y-%m-%d %H:%M:%S'),
+        'Status': 'Waiting',
+        'Assigned_Hospital': 'Unassigned',
+        'Diagnosis': 'Nothing',
+    })
+
+    # Hospitals are spread evenly over the regions and together can absorb
+    # roughly 80% of the patients, so the capacity constraints actually bind
+    beds = np.maximum(rng.integers(50, 150, n_hospitals) * n_patients // (100 * n_hospitals) * 8 // 10, 1)
+    hospitals_df = pd.DataFrame({
+        'Hospital_ID': [f"H-{i:03d}" for i in range(1, n_hospitals + 1)],
+        'Name': [f"Hospital {i}" for i in range(1, n_hospitals + 1)],
+        'Region': [REGIONS[i % len(REGIONS)] for i in range(n_hospitals)],
+        'Beds_Available': beds,
+        'Beds_Capacity': beds * 2,
+        'Staff_Available': beds // 2 + 1,
+        'Ventilators': beds // 5,
+        'Current_Patients': beds,
+    })
+
+    # Suppliers together stock a little more than the patients could need
+    share = rng.dirichlet(np.ones(n_suppliers))
+    suppliers_df = pd.DataFrame({
+        'Supplier_ID': [f"SUP-{i:03d}" for i in range(1, n_suppliers + 1)],
+        'Region': [REGIONS[i % len(REGIONS)] for i in range(n_suppliers)],
+        'Beds': np.ceil(share * n_patients * 1.2).astype(int),
+        'Staff': np.ceil(share * n_patients * 0.6).astype(int),
+        'Medical_Kits': np.ceil(share * n_patients * 1.2).astype(int),
+        'Ventilators': np.ceil(share * n_patients * 0.1).astype(int),
+    })
+
+    return patients_df, hospitals_df, suppliers_df
+
+
+def build_allocation_model_legacy(patients, hospitals):
+    """Reference copy of the original per-pair model construction, kept for comparison."""
+    model = pl.LpProblem("Healthcare_Resource_Allocation", pl.LpMaximize)
+
+    x = pl.LpVariable.dicts("patient_assignment",
+                          [(i, j) for i in patients.index for j in hospitals.index],
+                          cat=pl.LpBinary)
+
+    objective = pl.lpSum([x[i,j] * patients.loc[i, 'Priority_Score'] *
+                        (2 if patients.loc[i, 'Region'] == hospitals.loc[j, 'Region'] else 1)
+                        for i in patients.index for j in hospitals.index])
+    model += objective
+
+    for i in patients.index:
+        model += pl.lpSum([x[i,j] for j in hospitals.index]) <= 1
+
+    for j in hospitals.index:
+        model += pl.lpSum([x[i,j] for i in patients.index]) <= hospitals.loc[j, 'Effective_Beds']
+
+    if 'Effective_Staff' in hospitals.columns:
+        for j in hospitals.index:
+            model += pl.lpSum([x[i,j] * 0.5 for i in patients.index]) <= hospitals.loc[j, 'Effective_Staff']
+
+    if 'MEWS_Score' in patients.columns and 'Ventilators' in hospitals.columns:
+        critical_patients = [i for i in patients.index if patients.loc[i, 'MEWS_Score'] >= 5]
+        for j in hospitals.index:
+            model += pl.lpSum([x[i,j] for i in critical_patients]) <= hospitals.loc[j, 'Ventilators']
+
+    return model, x
+
+
+def write_synthetic_data(n_patients, n_hospitals=20, seed=42, n_suppliers=5, directory=None):
+    """Write synthetic CSVs to a directory and return the (patients, hospitals, suppliers) paths."""
+    directory = directory or tempfile.mkdtemp(prefix="allocation_benchmark_")
+    frames = generate_synthetic_data(n_patients, n_hospitals, seed, n_suppliers)
+
+    paths = []
+    for name, df in zip(["patients", "hospitals", "suppliers"], frames):
+        path = os.path.join(directory, f"{name}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return tuple(paths)
+
+
+def make_allocator(n_patients, n_hospitals=20, seed=42, directory=None, n_suppliers=5):
+    """Write synthetic CSVs to a directory and load them into an allocator."""
+    return HealthcareResourceAllocator(*write_synthetic_data(n_patients, n_hospitals, seed, n_suppliers, directory))
+
+
+def benchmark_model_build(sizes, n_hospitals=20, legacy=True, legacy_limit=None):
+    """Time model construction for each patient count, vectorized vs. legacy builder."""
+    rows = []
+    for n_patients in sizes:
+        allocator = make_allocator(n_patients, n_hospitals)
+        patients, hospitals = allocator.patients_df, allocator.hospitals_df
+
+        start = time.perf_counter()
+        model, x, _ = allocator._build_allocation_model(patients, hospitals)
+        vectorized_s = time.perf_counter() - start
+        row = {
+            'Patients': n_patients,
+            'Hospitals': n_hospitals,
+            'Variables': len(x),
+            'Constraints': len(model.constraints),
+            'Vectorized_s': vectorized_s,
+            'Legacy_s': np.nan,
+            'Speedup': np.nan,
+        }
+
+        if legacy and (legacy_limit is None or n_patients <= legacy_limit):
+            start = time.perf_counter()
+            build_allocation_model_legacy(patients, hospitals)
+            row['Legacy_s'] = time.perf_counter() - start
+            row['Speedup'] = row['Legacy_s'] / vectorized_s
+
+        rows.append(row)
+        print(f"{n_patients} patients: vectorized {vectorized_s:.2f}s, legacy {row['Legacy_s']:.2f}s")
+
+    return pd.DataFrame(rows)
+
+
+def run_phases(n_patients, n_hospitals=20, n_suppliers=5, seed=42, engine='milp', writeback='csv',
+               time_limit=None, mip_gap=None):
+    """Run a full allocation on synthetic data with an instrumented allocator and time each phase.
+
+    The seconds per phase (see PHASES) are the allocator's own _phase records, so
+    load and preprocess are measured in its constructor. Returns them with the model
+    size and the solver outcome. Everything is written to a temporary directory.
+    """
+    directory = tempfile.mkdtemp(prefix="allocation_benchmark_")
+    patients_file, hospitals_file, suppliers_file = write_synthetic_data(
+        n_patients, n_hospitals, seed, n_suppliers, directory)
+
+    allocator = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file, instrument=True)
+    result = allocator.run_full_allocation(json_file=os.path.join(directory, "patients_allocation.json"),
+                                           engine=engine, time_limit=time_limit, mip_gap=mip_gap,
+                                           writeback=writeback)
+    phases = result['metrics']['phases']
+    info = result['solver']['allocation']
+
+    row = {'Patients': n_patients, 'Hospitals': n_hospitals, 'Suppliers': n_suppliers, 'Engine': engine}
+    if engine == 'milp':
+        row.update(Variables=info.get('variables'), Constraints=info.get('constraints'))
+    row.update({
+        'Status': info['status'],
+        'Objective': info['objective'],
+        'Assigned_Patients': int(result['reports']['patient_summary']['Assigned_Patients']),
+        'Supplier_Cost': result['solver']['supplier']['objective'] if 'supplier' in result['solver'] else None,
+    })
+    row.update({f"{phase}_s": phases[phase]['wall_s'] if phase in phases else 0.0 for phase in PHASES})
+    row['total_s'] = sum(row[f"{phase}_s"] for phase in PHASES)
+    return row
+
+
+def benchmark_phases(sizes, n_hospitals=20, n_suppliers=5, seed=42, engine='milp', writeback='csv',
+                     repeats=1, time_limit=None, mip_gap=None):
+    """Time every phase for each patient count, keeping the fastest of repeats runs per phase."""
+    rows = []
+    for n_patients in sizes:
+        runs = [run_phases(n_patients, n_hospitals, n_suppliers, seed, engine, writeback, time_limit, mip_gap)
+                for _ in range(repeats)]
+        row = dict(runs[0])
+        for key in [f"{phase}_s" for phase in PHASES] + ['total_s']:
+            row[key] = min(run[key] for run in runs)
+        rows.append(row)
+        print(f"{n_patients} patients: " + ", ".join(f"{phase} {row[phase + '_s']:.2f}s" for phase in PHASES))
+    return pd.DataFrame(rows)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results, parameters):
+    """Wrap benchmark rows with the environment they were measured in."""
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {'pandas': pd.__version__, 'numpy': np.__version__, 'pulp': pl.__version__},
+        'parameters': parameters,
+        'results': json.loads(results.to_json(orient='records')),
+    }
+
+
+def compare_reports(baseline, current, tolerance=0.2, min_seconds=0.05):
+    """List phases that got more than tolerance slower than in the baseline report.
+
+    Phases faster than min_seconds in both reports are ignored as noise.
+    """
+    previous = {(r['Patients'], r['Engine']): r for r in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        old = previous.get((row['Patients'], row['Engine']))
+        if old is None:
+            continue
+        for key in [f"{phase}_s" for phase in PHASES] + ['total_s']:
+            before, after = old.get(key), row.get(key)
+            if before is None or after is None or max(before, after) < min_seconds:
+                continue
+            if after > before * (1 + tolerance):
+                regressions.append({'Patients': row['Patients'], 'Engine': row['Engine'], 'Phase': key[:-2],
+                                    'Baseline_s': before, 'Current_s': after, 'Ratio': after / before})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the allocator.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--hospitals", type=int, default=20)
+    parser.add_argument("--legacy-limit", type=int, default=None,
+                        help="Skip the legacy builder above this many patients")
+    parser.add_argument("--phases", action="store_true",
+                        help="Time every phase of a full allocation run instead of only model construction")
+    parser.add_argument("--suppliers", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engine", choices=['milp', 'flow'], default='milp')
+    parser.add_argument("--writeback", choices=['csv', 'changelog'], default='csv')
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--output", help="Write a JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if not args.phases:
+        results = benchmark_model_build(args.sizes, args.hospitals, legacy_limit=args.legacy_limit)
+        print()
+        print(results.to_string(index=False))
+        return
+
+    results = benchmark_phases(args.sizes, args.hospitals, args.suppliers, args.seed, args.engine,
+                               args.writeback, args.repeats, args.time_limit)
+    print()
+    print(results.to_string(index=False))
+
+    report = build_report(results, {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')})
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        for r in regressions:
+            print(f"Regression: {r['Patients']} patients {r['Engine']} {r['Phase']} "
+                  f"{r['Baseline_s']:.2f}s -> {r['Current_s']:.2f}s ({r['Ratio']:.2f}x)")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import copy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Allocator attributes a scenario may override
+SCENARIO_PARAMETERS = ('staff_per_patient', 'region_weight', 'critical_mews')
+
+# Raw capacity columns and the effective columns the model reads from them
+EFFECTIVE_COLUMNS = {'Beds_Available': 'Effective_Beds', 'Staff_Available': 'Effective_Staff'}
+
+# Allocator state shipped once to each worker process
+_base_allocator = None
+
+
+def _init_worker(allocator):
+    global _base_allocator
+    _base_allocator = allocator
+
+
+def _scenario_allocator(base, scenario):
+    """Copy the base allocator's in-memory state and apply a scenario's perturbations.
+
+    Scenario keys:
+      staff_per_patient, region_weight, critical_mews -- replace the model parameter
+      capacity_scale  -- {column: factor} applied to every hospital
+      hospital_deltas -- {hospital name: {column: change}}, e.g.
+                         {'North General': {'Ventilators': -20}}
+    Capacities are clipped at zero.
+    """
+    allocator = copy.copy(base)
+    allocator.patients_df = base.patients_df.copy()
+    allocator.hospitals_df = base.hospitals_df.copy()
+    allocator.suppliers_df = base.suppliers_df.copy()
+    allocator.allocation_results = None
+    allocator.supply_results = None
+    allocator.assignment = {}
+    allocator.solve_info = {}
+
+    for parameter in SCENARIO_PARAMETERS:
+        if parameter in scenario:
+            setattr(allocator, parameter, scenario[parameter])
+
+    hospitals = allocator.hospitals_df
+    changed = set()
+    for column, factor in scenario.get('capacity_scale', {}).items():
+        hospitals[column] = hospitals[column].astype(float) * factor
+        changed.add(column)
+
+    names = hospitals['Name'] if 'Name' in hospitals.columns else pd.Series(hospitals.index, index=hospitals.index)
+    for name, deltas in scenario.get('hospital_deltas', {}).items():
+        rows = names == name
+        if not rows.any():
+            raise ValueError(f"Unknown hospital '{name}' in scenario '{scenario.get('name')}'")
+        for column, delta in deltas.items():
+            hospitals[column] = hospitals[column].astype(float)
+            hospitals.loc[rows, column] += delta
+            changed.add(column)
+
+    for column in changed:
+        hospitals[column] = hospitals[column].clip(lower=0)
+        # Keep the effective capacity the model reads in sync with the raw column
+        if column in EFFECTIVE_COLUMNS:
+            hospitals[EFFECTIVE_COLUMNS[column]] = hospitals[column]
+
+    return allocator
+
+
+def _scenario_metrics(allocator, scenario, engine, time_limit, mip_gap, suppliers):
+    """Solve one scenario in memory and flatten its generate_reports output into a row."""
+    start = time.perf_counter()
+    allocator.optimize_allocation(engine=engine, time_limit=time_limit, mip_gap=mip_gap)
+    if suppliers:
+        allocator.allocate_supplier_resources()
+    reports = allocator.generate_reports()
+
+    utilization = pd.DataFrame.from_dict(reports['hospital_utilization'], orient='index')
+    results = allocator.allocation_results
+    critical = results['MEWS_Score'] >= allocator.critical_mews if 'MEWS_Score' in results.columns else \
+        pd.Series(False, index=results.index)
+
+    row = {'Scenario': scenario.get('name', 'scenario')}
+    row.update(reports['patient_summary'])
+    row['Assigned_Percent'] = row['Assigned_Patients'] / row['Total_Patients'] * 100 if row['Total_Patients'] else 0.0
+    row['Critical_Unassigned'] = int((critical & (results['Assigned_Hospital'] == 'Unassigned')).sum())
+    row['Mean_Utilization_Percent'] = utilization['Utilization_Percent'].mean()
+    row['Max_Utilization_Percent'] = utilization['Utilization_Percent'].max()
+    row['Objective'] = allocator.allocation_objective
+    row['Solver_Status'] = allocator.solve_info['allocation']['status']
+    if suppliers:
+        row['Supplier_Cost'] = allocator.solve_info['supplier']['objective'] if 'supplier' in allocator.solve_info else np.nan
+    row['Wall_Time_s'] = time.perf_counter() - start
+    return row
+
+
+def _run_scenario(scenario, engine, time_limit, mip_gap, suppliers):
+    allocator = _scenario_allocator(_base_allocator, scenario)
+    return _scenario_metrics(allocator, scenario, engine, time_limit, mip_gap, suppliers)
+
+
+def run_scenarios(allocator, scenarios, engine='milp', time_limit=None, mip_gap=None, suppliers=False,
+                  max_workers=None, include_baseline=True):
+    """Run what-if scenarios against an allocator's current data and compare them.
+
+    Every scenario is solved on its own copy of the allocator's in-memory frames in a
+    process pool, so neither the allocator nor the source CSVs are modified. Returns
+    one row of generate_reports metrics per scenario, indexed by scenario name, with
+    the unperturbed baseline first.
+    """
+    scenarios = [dict(s, name=s.get('name', f"scenario_{i}")) for i, s in enumerate(scenarios, 1)]
+    if include_baseline:
+        scenarios = [{'name': 'baseline'}] + scenarios
+
+    # Validate perturbations up front instead of inside the workers
+    for scenario in scenarios:
+        _scenario_allocator(allocator, scenario)
+
+    max_workers = max_workers or min(len(scenarios), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(allocator,)) as pool:
+        futures = [pool.submit(_run_scenario, scenario, engine, time_limit, mip_gap, suppliers)
+                   for scenario in scenarios]
+        rows = [future.result() for future in futures]
+
+    return pd.DataFrame(rows).set_index('Scenario')
@@ -0,0 +1,265 @@
+from flask import Flask, request, jsonify, Response
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from resource_alloc import HealthcareResourceAllocator
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Data files, overridable through the environment
+PATIENTS_FILE = os.environ.get('ALLOCATION_PATIENTS_FILE',
+                               os.path.join(BASE_DIR, 'Triage Flagging', 'final_synthetic_triage_data.csv'))
+HOSPITALS_FILE = os.environ.get('ALLOCATION_HOSPITALS_FILE', os.path.join(BASE_DIR, 'hospitals.csv'))
+SUPPLIERS_FILE = os.environ.get('ALLOCATION_SUPPLIERS_FILE', os.path.join(BASE_DIR, 'supplier.csv'))
+ALLOCATION_ENGINE = os.environ.get('ALLOCATION_ENGINE', 'milp')
+ALLOCATION_INSTRUMENT = os.environ.get('ALLOCATION_INSTRUMENT', '0') == '1'
+
+# Events kept per subscriber before a slow dashboard starts losing updates
+EVENT_QUEUE_SIZE = 100
+
+
+def _json_default(value):
+    """Convert NumPy/pandas scalars and timestamps that json cannot serialize."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def _records(frame):
+    """DataFrame rows as dicts with missing values as None (json would write a bare NaN)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _without_nan(value):
+    """Replace float NaN/inf nested in dicts and lists with None."""
+    if isinstance(value, dict):
+        return {k: _without_nan(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_nan(v) for v in value]
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _dumps(payload):
+    # allow_nan=False so a NaN that slips through fails loudly instead of producing invalid JSON
+    return json.dumps(_without_nan(payload), default=_json_default, allow_nan=False)
+
+
+def _json_response(payload, status=200):
+    return Response(_dumps(payload), status=status, mimetype='application/json')
+
+
+class AllocationService:
+    """Keeps one allocator and its assignment in memory and serializes access to it.
+
+    Arrivals and discharges are applied incrementally (add_patients /
+    discharge_patients) instead of re-running the full solve, and every change
+    bumps a version number and is pushed to the subscribed event streams.
+    """
+
+    def __init__(self, patients_file, hospitals_file, suppliers_file, engine='milp', instrument=False):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.version = 0
+        self.subscribers = []
+        self.allocator = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file,
+                                                     instrument=instrument)
+        self.allocator.optimize_allocation(engine=engine)
+
+    def _publish(self, event, payload):
+        """Bump the version and push an event to every subscriber. Caller holds the lock."""
+        self.version += 1
+        message = _dumps(dict(payload, event=event, version=self.version))
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Drop subscribers that stopped reading
+                self.subscribers.remove(subscriber)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def add_arrivals(self, patients, max_reshuffle=0):
+        with self.lock:
+            changed = self.allocator.add_patients(patients, engine=self.engine, max_reshuffle=max_reshuffle)
+            records = _records(changed)
+            self._publish('arrivals', {'assignments': records})
+            return {'version': self.version, 'assignments': records}
+
+    def discharge(self, patient_ids):
+        with self.lock:
+            discharged = self.allocator.discharge_patients(patient_ids)
+            self._publish('discharges', {'patient_ids': patient_ids, 'discharged': discharged})
+            return {'version': self.version, 'discharged': discharged}
+
+    def resolve(self):
+        """Re-run the full solve over every patient currently in memory."""
+        with self.lock:
+            results = self.allocator.optimize_allocation(engine=self.engine, warm_start=True)
+            self._publish('resolve', {'solver': self.allocator.solve_info.get('allocation')})
+            return {'version': self.version, 'assigned': int((results['Assigned_Hospital'] != 'Unassigned').sum())}
+
+    def assignments(self):
+        with self.lock:
+            return {'version': self.version, 'assignments': _records(self.allocator.allocation_results)}
+
+    def patients(self):
+        with self.lock:
+            return {'version': self.version, 'patients': _records(self.allocator.create_patient_frame())}
+
+    def patients_page(self, page, page_size, sort_by, hospital=None):
+        with self.lock:
+            return dict(self.allocator.export_patients_page(page, page_size, sort_by, hospital), version=self.version)
+
+    def utilization(self):
+        with self.lock:
+            return dict(self.allocator.generate_reports(), version=self.version)
+
+    def metrics(self):
+        with self.lock:
+            return self.allocator.metrics_prometheus()
+
+    def persist(self):
+        """Append the current assignments to the patients change log.
+
+        Patients that arrived through add_arrivals are logged with their full record,
+        so they are restored when the service restarts.
+        """
+        with self.lock:
+            changed = self.allocator.update_csv_files(self.allocator.create_patient_json(), writeback='changelog')
+            return {'version': self.version, 'changed': changed}
+
+
+app = Flask(__name__)
+service = None
+
+
+def get_service():
+    """Load the data and run the initial solve on first use."""
+    global service
+    if service is None:
+        service = AllocationService(PATIENTS_FILE, HOSPITALS_FILE, SUPPLIERS_FILE, engine=ALLOCATION_ENGINE,
+                                    instrument=ALLOCATION_INSTRUMENT)
+    return service
+
+
+@app.route('/api/allocation/assignments', methods=['GET'])
+def get_assignments():
+    return _json_response(get_service().assignments())
+
+
+@app.route('/api/allocation/patients', methods=['GET'])
+def get_patients():
+    """Same records as patients_allocation.json, served from memory.
+
+    With ?page=N (and optionally page_size, sort=priority|hospital, hospital=name)
+    only that page of the most urgent patients is returned.
+    """
+    if 'page' not in request.args:
+        return _json_response(get_service().patients())
+    try:
+        return _json_response(get_service().patients_page(request.args.get('page', 0, type=int),
+                                                          request.args.get('page_size', 50, type=int),
+                                                          request.args.get('sort', 'priority'),
+                                                          request.args.get('hospital')))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+@app.route('/api/allocation/utilization', methods=['GET'])
+def get_utilization():
+    return _json_response(get_service().utilization())
+
+
+@app.route('/api/allocation/arrivals', methods=['POST'])
+def post_arrivals():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        patients = data.get('patients', [])
+        max_reshuffle = int(data.get('max_reshuffle', 0))
+    else:
+        patients, max_reshuffle = data or [], 0
+
+    if not patients:
+        return jsonify({'status': 'error', 'message': 'No patients submitted'}), 400
+    try:
+        return _json_response(dict(get_service().add_arrivals(patients, max_reshuffle), status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+@app.route('/api/allocation/discharges', methods=['POST'])
+def post_discharges():
+    data = request.get_json(silent=True) or {}
+    patient_ids = data.get('patient_ids', []) if isinstance(data, dict) else data
+    try:
+        return _json_response(dict(get_service().discharge(patient_ids), status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+@app.route('/api/allocation/resolve', methods=['POST'])
+def post_resolve():
+    try:
+        return _json_response(dict(get_service().resolve(), status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/allocation/persist', methods=['POST'])
+def post_persist():
+    try:
+        return _json_response(dict(get_service().persist(), status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint; phase timings need ALLOCATION_INSTRUMENT=1."""
+    return Response(get_service().metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/allocation/events', methods=['GET'])
+def get_events():
+    """Server-sent events stream with one message per change."""
+    current = get_service()
+    subscriber = current.subscribe()
+
+    def stream():
+        try:
+            yield f"data: {json.dumps({'event': 'connected', 'version': current.version})}\n\n"
+            while True:
+                try:
+                    yield f"data: {subscriber.get(timeout=15)}\n\n"
+                except queue.Empty:
+                    # Keep idle connections open through proxies
+                    yield ": keep-alive\n\n"
+        finally:
+            current.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+if __name__ == '__main__':
+    get_service()
+    app.run(host='0.0.0.0', port=int(os.environ.get('ALLOCATION_PORT', 5001)), threaded=True)
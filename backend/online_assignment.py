@@ -0,0 +1,141 @@
+import heapq
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class OnlineBedAssigner:
+    """Sub-millisecond hospital assignment for single arrivals between batch solves.
+
+    Starts from the residual capacity of a HealthcareResourceAllocator that has
+    already run optimize_allocation. Hospitals sit in max-heaps keyed by how many more
+    patients they can take (beds, staff_per_patient staff and, for critical patients,
+    ventilators), one heap per (region, critical) pair plus one per criticality
+    across all regions. An arrival takes the roomiest hospital in its own region,
+    or the roomiest anywhere when its region is full, in O(log H).
+
+    Heap entries are invalidated lazily: every capacity change bumps the hospital's
+    version and pushes fresh entries, and stale entries are discarded when they reach
+    the top. Arrivals are buffered until reconcile() hands them to the allocator's
+    batch optimization and rebuilds the heaps from the new residual capacity.
+    """
+
+    def __init__(self, allocator):
+        if allocator.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
+        self.allocator = allocator
+        self.pending = []
+        self._rebuild()
+
+    def _rebuild(self):
+        """Load residual capacity from the allocator and rebuild every heap."""
+        allocator = self.allocator
+        hospitals = allocator.hospitals_df
+        residual = allocator.residual_capacity
+
+        self.names = hospitals['Name'].to_numpy(dtype=object) if 'Name' in hospitals.columns else \
+            np.array([f"Hospital_{j}" for j in hospitals.index], dtype=object)
+        self.regions = hospitals['Region'].to_numpy(dtype=object)
+        self.beds = np.floor(residual['Beds'].to_numpy(dtype=float)).clip(min=0)
+        self.staff = residual['Staff'].to_numpy(dtype=float).clip(min=0)
+        self.ventilators = np.floor(residual['Ventilators'].to_numpy(dtype=float)).clip(min=0)
+        self.version = np.zeros(len(hospitals), dtype=np.int64)
+
+        self.heaps = {}
+        for h in range(len(hospitals)):
+            self._push(h)
+
+    def _room(self, h, critical):
+        """How many more patients of this criticality hospital h can take."""
+        room = self.beds[h]
+        if self.allocator.staff_per_patient > 0:
+            room = min(room, np.floor(self.staff[h] / self.allocator.staff_per_patient))
+        if critical:
+            room = min(room, self.ventilators[h])
+        return room
+
+    def _push(self, h):
+        """Push hospital h's current room into every heap it belongs to."""
+        for critical in (False, True):
+            room = self._room(h, critical)
+            if room < 1:
+                continue
+            entry = (-room, int(self.version[h]), h)
+            for key in ((self.regions[h], critical), (None, critical)):
+                heapq.heappush(self.heaps.setdefault(key, []), entry)
+
+    def _best(self, key):
+        """Index of the roomiest valid hospital in a heap, dropping stale entries."""
+        heap = self.heaps.get(key)
+        while heap:
+            _, version, h = heap[0]
+            if version == self.version[h]:
+                return h
+            heapq.heappop(heap)
+        return None
+
+    def assign(self, patient):
+        """Assign one arriving patient (a dict of patient columns) and return the hospital name.
+
+        Returns None when no hospital can take the patient. The patient is buffered
+        for the next reconcile().
+        """
+        region = patient.get('Region')
+        mews = pd.to_numeric(patient.get('MEWS_Score'), errors='coerce')
+        critical = bool(mews >= self.allocator.critical_mews) if pd.notna(mews) else False
+
+        h = self._best((region, critical))
+        if h is None:
+            h = self._best((None, critical))
+
+        if h is not None:
+            self.beds[h] -= 1
+            self.staff[h] -= self.allocator.staff_per_patient
+            if critical:
+                self.ventilators[h] -= 1
+            self.version[h] += 1
+            self._push(h)
+
+        hospital = self.names[h] if h is not None else None
+        self.pending.append((dict(patient), hospital))
+        return hospital
+
+    def reconcile(self, engine='milp', full=False, max_reshuffle=0, time_limit=None, mip_gap=None):
+        """Hand buffered arrivals to the batch optimizer and reload the heaps.
+
+        By default the arrivals are solved incrementally (add_patients); full=True
+        re-runs optimize_allocation over every patient, warm-started. Returns a
+        DataFrame of the arrivals whose batch assignment differs from the online one.
+        """
+        if not self.pending:
+            return pd.DataFrame(columns=['Patient_ID', 'Online_Hospital', 'Assigned_Hospital'])
+
+        start = time.perf_counter()
+        arrivals = pd.DataFrame([patient for patient, _ in self.pending])
+        online = [hospital or 'Unassigned' for _, hospital in self.pending]
+
+        results = self.allocator.add_patients(arrivals, engine=engine, max_reshuffle=max_reshuffle,
+                                              time_limit=time_limit, mip_gap=mip_gap)
+        labels = results.index[-len(arrivals):]
+        if full:
+            self.allocator.optimize_allocation(engine=engine, time_limit=time_limit, mip_gap=mip_gap,
+                                               warm_start=True)
+        batch = self.allocator.allocation_results.loc[labels]
+
+        changes = pd.DataFrame({
+            'Patient_ID': batch['Patient_ID'].to_numpy(),
+            'Online_Hospital': online,
+            'Assigned_Hospital': batch['Assigned_Hospital'].to_numpy()
+        })
+        changes = changes[changes['Online_Hospital'] != changes['Assigned_Hospital']].reset_index(drop=True)
+
+        self.allocator.solve_info['reconcile'] = {
+            'arrivals': len(arrivals),
+            'changed': len(changes),
+            'full': full,
+            'wall_time_s': time.perf_counter() - start
+        }
+        self.pending = []
+        self._rebuild()
+        return changes
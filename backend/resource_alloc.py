@@ -6,28 +6,405 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import json
 import os
+import sys
+import re
+import time
+import hashlib
+import functools
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from triage_normalization import TRIAGE_NORMALIZATION, normalize_triage
+
+# Default model parameters (see HealthcareResourceAllocator.__init__)
+STAFF_PER_PATIENT = 0.5
+REGION_WEIGHT = 2.0
+CRITICAL_MEWS = 5
+
+# Assignment engines accepted by HealthcareResourceAllocator.optimize_allocation
+ALLOCATION_ENGINES = ('milp', 'flow')
+
+# Allocator attributes a regional worker process needs to solve a subproblem
+SOLVER_SETTINGS = ('staff_per_patient', 'region_weight', 'critical_mews',
+                   'travel_cache_dir', 'travel_speed_kmh', 'travel_time_scale', 'travel_destinations')
+
+# Largest patient x hospital grid the CBC optimality-gap check will be run on
+GAP_CHECK_MAX_PAIRS = 200000
+
+# Relative gap to the full MILP above which a decomposed solve is reported
+DECOMPOSE_GAP_WARNING = 0.01
+
+# Priority scores are scaled to integers for the network simplex
+FLOW_COST_SCALE = 10 ** 6
+
+# Resources suppliers can ship, and how allocate_supplier_resources plans them
+SUPPLIER_RESOURCES = ('Beds', 'Staff', 'Medical_Kits')
+SUPPLIER_METHODS = ('greedy', 'lp', 'milp')
+
+# How update_csv_files persists patient assignments
+WRITEBACK_MODES = ('csv', 'changelog')
+
+# Patient columns recorded in the append-only change log. Entries for patients that
+# are not in the patients file also carry the full row as JSON in CHANGE_LOG_RECORD.
+CHANGE_LOG_COLUMNS = ['Patient ID', 'Assigned_Hospital', 'Status', 'Diagnosis']
+CHANGE_LOG_RECORD = 'Record'
+
+# Declared dtypes for the columnar (Parquet / Arrow IPC) store. Columns written back
+# by update_csv_files / apply_change_log (CHANGE_LOG_COLUMNS) are left out on purpose:
+# a categorical column rejects labels outside its categories.
+PATIENT_SCHEMA = {
+    'Region': 'category',
+    'Triage Priority': 'category',
+    'Derived_Severity': 'category',
+    'Arrival Mode': 'category',
+    'MEWS_Score': 'float32',
+    'Time_Criticality_Min': 'float32',
+    'Triage_Priority_Numeric': 'float32',
+    'Priority_Score': 'float32',
+    'Time of Arrival': 'datetime64[ns]'
+}
+HOSPITAL_SCHEMA = {
+    'Region': 'category',
+    'Last_Updated': 'datetime64[ns]'
+}
+SUPPLIER_SCHEMA = {
+    'Region': 'category',
+    'Last_Updated': 'datetime64[ns]'
+}
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+# Orderings accepted by export_patients_page / export_patients_ndjson
+EXPORT_SORTS = ('priority', 'hospital')
+
+# Travel-time model: great-circle distance at an average road speed
+COORDINATE_COLUMNS = ['Latitude', 'Longitude']
+EARTH_RADIUS_KM = 6371.0
+TRAVEL_SPEED_KMH = 40.0
+TRAVEL_TIME_SCALE_MIN = 30.0
+
+
+def _apply_schema(df, schema):
+    """Cast the columns named in schema to their declared dtypes, coercing bad values to NaN/NaT."""
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return df
+
+
+def _writable_columns(df, columns):
+    """Turn categorical columns among columns into object columns so any label can be assigned."""
+    for col in columns:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def read_table(path, columns=None):
+    """Read a CSV, Parquet or Arrow IPC file, loading only the requested columns.
+    
+    Parquet and Arrow files are memory-mapped and keep the dtypes they were written
+    with, so no type inference happens at load time.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if ext in ARROW_EXTENSIONS:
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    if columns is not None:
+        wanted = set(columns)
+        return pd.read_csv(path, usecols=lambda c: c in wanted)
+    return pd.read_csv(path)
+
+
+def write_table(df, path):
+    """Write a DataFrame in the format implied by the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        df.to_parquet(path, index=False)
+    elif ext in ARROW_EXTENSIONS:
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def convert_csv_to_columnar(csv_file, output_file=None, schema=None):
+    """One-time conversion of an allocator CSV into a typed Parquet or Arrow IPC file.
+    
+    schema defaults to PATIENT_SCHEMA; the output format follows output_file's
+    extension (Parquet when omitted). Returns the output path.
+    """
+    output_file = output_file or f"{os.path.splitext(csv_file)[0]}.parquet"
+    df = _apply_schema(pd.read_csv(csv_file), PATIENT_SCHEMA if schema is None else schema)
+    write_table(df, output_file)
+    return output_file
+
+
+def haversine_minutes(origins, destinations, speed_kmh=TRAVEL_SPEED_KMH):
+    """Travel time in minutes between (n, 2) and (m, 2) arrays of latitude/longitude degrees."""
+    lat1, lon1 = np.radians(origins[:, 0])[:, None], np.radians(origins[:, 1])[:, None]
+    lat2, lon2 = np.radians(destinations[:, 0])[None, :], np.radians(destinations[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return (distance_km / speed_kmh * 60).astype(np.float32)
+
+
+def travel_time_matrix(origins, destinations, cache_dir, speed_kmh=TRAVEL_SPEED_KMH):
+    """Origin x destination travel-time matrix, kept in one growing cache file per destination set.
+    
+    The cache file is keyed by a hash of the destinations and the speed, so a changed
+    hospital location invalidates it. It holds one row per origin location seen so
+    far (latitude, longitude, then the travel time to each destination); rows are
+    looked up by location and only new locations are computed and appended, so
+    patient batches, regions and supplier sets all share it. A road-network matrix
+    in the same layout can be dropped into the cache under the same key to replace
+    the haversine estimate.
+    """
+    origins = np.ascontiguousarray(origins, dtype=np.float64).reshape(-1, 2)
+    destinations = np.ascontiguousarray(destinations, dtype=np.float64).reshape(-1, 2)
+    key = hashlib.sha1(destinations.tobytes() + f"|{speed_kmh}".encode()).hexdigest()
+    path = os.path.join(cache_dir, f"travel_{key}.npy")
+    
+    cached = np.load(path, mmap_mode='r') if os.path.exists(path) else np.empty((0, 2 + len(destinations)))
+    known = pd.MultiIndex.from_arrays([cached[:, 0], cached[:, 1]])
+    rows = known.get_indexer(pd.MultiIndex.from_arrays([origins[:, 0], origins[:, 1]]))
+    
+    missing = rows < 0
+    if missing.any():
+        new, position = np.unique(origins[missing], axis=0, return_inverse=True)
+        cached = np.vstack([cached, np.hstack([new, haversine_minutes(new, destinations, speed_kmh)])])
+        rows[missing] = len(cached) - len(new) + position.ravel()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial matrix
+        temp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(temp_path, cached)
+        os.replace(temp_path, path)
+    
+    return cached[rows, 2:].astype(np.float32)
+
+
+def _json_encoder():
+    """Return a function encoding one record as a JSON line (bytes), using orjson when installed."""
+    try:
+        import orjson
+    except ImportError:
+        # orjson writes NaN and infinity as null; json would write bare NaN, which is not JSON
+        def encode(record):
+            record = {key: None if isinstance(value, (float, np.floating)) and not np.isfinite(value) else value
+                      for key, value in record.items()}
+            return json.dumps(record, default=str, allow_nan=False).encode() + b"\n"
+        return encode
+    # Timestamps are passed to default=str so both encoders write them the same way
+    options = orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+    return lambda record: orjson.dumps(record, default=str, option=options)
+
+
+def _wait_minutes(arrival):
+    """Whole minutes since each arrival timestamp as objects, 'Unknown' where it is missing."""
+    waittime = np.full(len(arrival), "Unknown", dtype=object)
+    minutes = ((pd.Timestamp(datetime.now()) - pd.to_datetime(pd.Series(arrival), errors='coerce'))
+               .dt.total_seconds() / 60).to_numpy()
+    known = ~np.isnan(minutes)
+    waittime[known] = minutes[known].astype(np.int64).astype(object)
+    return waittime
+
+
+def _frame_records(frame):
+    """Rows of a DataFrame as dicts, built column-wise (much faster than to_dict('records')).
+    
+    Datetime columns are formatted as strings up front, as default=str would.
+    """
+    columns = list(frame.columns)
+    values = [frame[c].astype(str).tolist() if frame[c].dtype.kind == 'M' else frame[c].tolist() for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def _peak_rss_bytes():
+    """Peak resident set size of this process, or None where the resource module is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _phase(name):
+    """Method decorator recording each call under metrics['phases'][name] when instrumenting."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.instrument:
+                return method(self, *args, **kwargs)
+            with self._measure(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _solve_region(settings, patients, hospitals, engine, time_limit=None, mip_gap=None):
+    """Worker-process entry point: solve one region's assignment subproblem."""
+    allocator = HealthcareResourceAllocator.__new__(HealthcareResourceAllocator)
+    allocator.__dict__.update(settings, instrument=False, _active_phase=None, assignment={}, solve_info={})
+    return allocator._solve_assignment(patients, hospitals, engine, time_limit=time_limit, mip_gap=mip_gap)
+
 
 class HealthcareResourceAllocator:
-    def __init__(self, patients_file, hospitals_file, suppliers_file):
-        """Initialize the resource allocator with data files."""
+    def __init__(self, patients_file, hospitals_file, suppliers_file, patient_columns=None, instrument=False):
+        """Initialize the resource allocator with data files.
+        
+        Files may be CSV, Parquet or Arrow IPC (see convert_csv_to_columnar). With
+        patient_columns only those patient columns are loaded; such a pruned frame can
+        only be persisted through the change log. With instrument=True the wall/CPU
+        time of every phase, model sizes and solver statistics are collected (see
+        get_metrics and metrics_prometheus).
+        """
+        self.instrument = instrument
+        self.metrics = {'phases': {}, 'peak_rss_bytes': None}
+        self._active_phase = None
+        
         self.patients_file = patients_file
         self.hospitals_file = hospitals_file
         self.suppliers_file = suppliers_file
+        self.patient_columns = patient_columns
+        # Keyed by the full file name so CSV/Parquet/Arrow copies of a dataset keep separate logs
+        self.change_log_file = f"{patients_file}.changes.csv"
+        
+        # Travel times are used once hospitals have Latitude/Longitude columns
+        self.travel_cache_dir = os.path.join(os.path.dirname(os.path.abspath(hospitals_file)), 'travel_cache')
+        self.travel_speed_kmh = TRAVEL_SPEED_KMH
+        self.travel_time_scale = TRAVEL_TIME_SCALE_MIN
+        
+        # Model parameters: staff members per patient, objective weight of a same-region
+        # hospital, and the MEWS score from which a patient needs a ventilator
+        self.staff_per_patient = STAFF_PER_PATIENT
+        self.region_weight = REGION_WEIGHT
+        self.critical_mews = CRITICAL_MEWS
         
-        self.patients_df = pd.read_csv(patients_file)
-        self.hospitals_df = pd.read_csv(hospitals_file)
-        self.suppliers_df = pd.read_csv(suppliers_file)
+        with self._measure('load'):
+            self.patients_df = read_table(patients_file, columns=patient_columns)
+            self.hospitals_df = read_table(hospitals_file)
+            self.suppliers_df = read_table(suppliers_file)
+        # Every travel-time lookup is made against all hospitals, so they share one cache file
+        self.travel_destinations = None
+        if all(c in self.hospitals_df.columns for c in COORDINATE_COLUMNS):
+            self.travel_destinations = self.hospitals_df[COORDINATE_COLUMNS].astype(float)
         self.allocation_results = None
+        self.allocation_objective = None
+        self.gap_check = None
+        self.assignment = {}
+        self.residual_capacity = None
+        self.solve_info = {}
+        self.supply_results = None
+        self.reservations = None
+        # Patients per hospital already added to the hospitals file by update_csv_files
+        self._persisted_hospital_counts = pd.Series(0.0, index=self.hospitals_df.index)
+        self.pareto_front = None
+        self.pareto_assignments = {}
+        # Sorted create_patient_frame results by (sort_by, hospital), valid for _export_source
+        self._export_frames = {}
+        self._export_source = None
+        # normalize_triage counts per column, summed over the load and every add_patients batch
+        self.normalization_counts = {}
+        
+        # Columns and Patient IDs held by the patients store, file plus change log inserts;
+        # other patients are written to the change log in full
+        self._stored_columns = list(self.patients_df.columns)
+        self._stored_patient_ids = set(self._patient_ids())
+        
+        # Bring patients up to date with assignments persisted in the change log
+        with self._measure('load'):
+            self.apply_change_log()
         
         # Preprocess data
         self._preprocess_data()
+    
+    @contextmanager
+    def _measure(self, name):
+        """Add the wall time, CPU time and peak RSS of a block to metrics['phases'][name].
+        
+        Only the outermost phase is recorded, so time spent in a nested phase (e.g. the
+        CBC solves inside supplier allocation) counts towards the phase that called it.
+        """
+        if not self.instrument or self._active_phase is not None:
+            yield
+            return
+        
+        self._active_phase = name
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._active_phase = None
+            phase = self.metrics['phases'].setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+            phase['wall_s'] += time.perf_counter() - wall
+            phase['cpu_s'] += time.process_time() - cpu
+            phase['calls'] += 1
+            phase['peak_rss_bytes'] = self.metrics['peak_rss_bytes'] = _peak_rss_bytes()
+    
+    def get_metrics(self):
+        """Phase timings, per-solve model size and solver statistics, and peak memory."""
+        return {
+            'enabled': self.instrument,
+            'phases': {name: dict(phase) for name, phase in self.metrics['phases'].items()},
+            'solver': {name: dict(info) for name, info in self.solve_info.items()},
+            'peak_rss_bytes': self.metrics['peak_rss_bytes']
+        }
+    
+    def metrics_prometheus(self, prefix='allocator'):
+        """Render get_metrics() in the Prometheus text exposition format."""
+        metrics = self.get_metrics()
+        lines = []
+        
+        def family(name, kind, help_text, samples):
+            if not samples:
+                return
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {float(value)!r}" if label_text else
+                             f"{prefix}_{name} {float(value)!r}")
+        
+        phases = metrics['phases'].items()
+        family('phase_wall_seconds_total', 'counter', 'Wall time spent per allocation phase',
+               [({'phase': p}, v['wall_s']) for p, v in phases])
+        family('phase_cpu_seconds_total', 'counter', 'CPU time spent per allocation phase',
+               [({'phase': p}, v['cpu_s']) for p, v in phases])
+        family('phase_calls_total', 'counter', 'Number of times each allocation phase ran',
+               [({'phase': p}, v['calls']) for p, v in phases])
+        
+        solves = [(name, info) for name, info in metrics['solver'].items() if isinstance(info, dict)]
+        for key, kind, help_text in [('variables', 'gauge', 'Variables in the last model solved'),
+                                     ('constraints', 'gauge', 'Constraints in the last model solved'),
+                                     ('nonzeros', 'gauge', 'Constraint matrix nonzeros in the last model solved'),
+                                     ('iterations', 'gauge', 'Simplex iterations of the last CBC solve'),
+                                     ('nodes', 'gauge', 'Branch-and-bound nodes of the last CBC solve'),
+                                     ('wall_time_s', 'gauge', 'Wall time of the last solve in seconds'),
+                                     ('objective', 'gauge', 'Objective value of the last solve')]:
+            family(f"solve_{key.replace('_time_s', '_seconds')}", kind, help_text,
+                   [({'model': name}, info[key]) for name, info in solves if info.get(key) is not None])
+        family('solve_best_effort', 'gauge', '1 when the last solve stopped before proving optimality',
+               [({'model': name}, bool(info.get('best_effort'))) for name, info in solves])
+        
+        if metrics['peak_rss_bytes'] is not None:
+            family('peak_rss_bytes', 'gauge', 'Peak resident set size of the process', [({}, metrics['peak_rss_bytes'])])
+        return "\n".join(lines) + "\n"
         
+    @_phase('preprocess')
     def _preprocess_data(self):
         """Preprocess and clean the data."""
         # Convert timestamps to datetime
-        if 'Time of Arrival' in self.patients_df.columns:
-            self.patients_df['Time of Arrival'] = pd.to_datetime(self.patients_df['Time of Arrival'])
-        
         if 'Last_Updated' in self.hospitals_df.columns:
             self.hospitals_df['Last_Updated'] = pd.to_datetime(self.hospitals_df['Last_Updated'])
             
@@ -38,64 +415,418 @@ class HealthcareResourceAllocator:
         self.hospitals_df['Effective_Beds'] = self.hospitals_df['Beds_Available']
         self.hospitals_df['Effective_Staff'] = self.hospitals_df['Staff_Available']
         
-        # Create patient priority score based on available metrics
-        # First check column data types and convert if necessary
-        if 'Triage Priority' in self.patients_df.columns:
-            # Handle case where Triage Priority is a string
-            try:
-                self.patients_df['Triage Priority'] = pd.to_numeric(self.patients_df['Triage Priority'])
-            except (ValueError, TypeError):
-                # If conversion fails, create a mapping for string values
-                priority_mapping = {'Immediate': 1, 'Emergency': 1, 'Urgent': 2, 'Semi-urgent': 3, 'Non-urgent': 4, 'Minor': 5}
-                # Apply with a default value of 3 (middle priority) for any unexpected values
-                self.patients_df['Triage_Priority_Numeric'] = self.patients_df['Triage Priority'].map(priority_mapping).fillna(3)
-        
-        # Same for MEWS Score
-        if 'MEWS_Score' in self.patients_df.columns:
-            try:
-                self.patients_df['MEWS_Score'] = pd.to_numeric(self.patients_df['MEWS_Score'])
-            except (ValueError, TypeError):
-                # Set default value if conversion fails
-                self.patients_df['MEWS_Score'] = 2  # Default moderate score
-        
-        # Same for Time Criticality
-        if 'Time_Criticality_Min' in self.patients_df.columns:
-            try:
-                self.patients_df['Time_Criticality_Min'] = pd.to_numeric(self.patients_df['Time_Criticality_Min'])
-            except (ValueError, TypeError):
-                # Set default value if conversion fails
-                self.patients_df['Time_Criticality_Min'] = 60  # Default 1 hour
+        # Preprocess patient records
+        self.patients_df = self._preprocess_patients(self.patients_df)
+    
+    @_phase('preprocess')
+    def _preprocess_patients(self, patients_df):
+        """Type-convert patient columns and compute Priority_Score for a patient DataFrame."""
+        # Convert timestamps to datetime
+        if 'Time of Arrival' in patients_df.columns:
+            patients_df['Time of Arrival'] = pd.to_datetime(patients_df['Time of Arrival'])
+        
+        # Coerce the triage columns value by value; bad or missing values get the
+        # rule's default instead of overwriting the whole column
+        values, _, counts = normalize_triage(patients_df)
+        for col, count in counts.items():
+            totals = self.normalization_counts.setdefault(col, dict.fromkeys(count, 0))
+            for key, value in count.items():
+                totals[key] = totals.get(key, 0) + value
+        for col, count in counts.items():
+            if count['invalid'] and not pd.isna(TRIAGE_NORMALIZATION[col]['default']):
+                print(f"Warning: {count['invalid']} invalid '{col}' values replaced with "
+                      f"{TRIAGE_NORMALIZATION[col]['default']}")
+        
+        def normalized(col):
+            # Keep clean numeric columns as they are, otherwise use the normalized values
+            if counts[col]['labels'] or counts[col]['defaulted'] or \
+                    not pd.api.types.is_numeric_dtype(patients_df[col]):
+                return values[col]
+            return patients_df[col]
+        
+        if 'Triage Priority' in patients_df.columns:
+            if counts['Triage Priority']['labels']:
+                # String priorities keep their labels; the mapped value goes in a numeric column
+                patients_df['Triage_Priority_Numeric'] = values['Triage Priority']
+            else:
+                patients_df['Triage Priority'] = normalized('Triage Priority')
+        
+        for col in ['MEWS_Score', 'Time_Criticality_Min']:
+            if col in patients_df.columns:
+                patients_df[col] = normalized(col)
         
         # Now calculate the priority score based on available and properly typed data
-        if all(col in self.patients_df.columns for col in ['Triage Priority', 'MEWS_Score', 'Time_Criticality_Min']):
-            if 'Triage_Priority_Numeric' in self.patients_df.columns:
+        if all(col in patients_df.columns for col in ['Triage Priority', 'MEWS_Score', 'Time_Criticality_Min']):
+            if 'Triage_Priority_Numeric' in patients_df.columns:
                 # Use the mapped numeric value
-                self.patients_df['Priority_Score'] = (5 - self.patients_df['Triage_Priority_Numeric']) * 5 + \
-                                                   self.patients_df['MEWS_Score'] * 2 + \
-                                                   (60 / (self.patients_df['Time_Criticality_Min'] + 1))
+                patients_df['Priority_Score'] = (5 - patients_df['Triage_Priority_Numeric']) * 5 + \
+                                              patients_df['MEWS_Score'] * 2 + \
+                                              (60 / (patients_df['Time_Criticality_Min'] + 1))
             else:
                 # Use the numeric Triage Priority directly
-                self.patients_df['Priority_Score'] = (5 - self.patients_df['Triage Priority']) * 5 + \
-                                                   self.patients_df['MEWS_Score'] * 2 + \
-                                                   (60 / (self.patients_df['Time_Criticality_Min'] + 1))
-        elif 'Derived_Severity' in self.patients_df.columns:
-            # Try to use derived severity if other metrics not available
-            try:
-                self.patients_df['Derived_Severity'] = pd.to_numeric(self.patients_df['Derived_Severity'])
-                self.patients_df['Priority_Score'] = self.patients_df['Derived_Severity'] * 10
-            except (ValueError, TypeError):
-                # If conversion fails, use a simple default score
-                self.patients_df['Priority_Score'] = 50  # Middle priority
+                patients_df['Priority_Score'] = (5 - patients_df['Triage Priority']) * 5 + \
+                                              patients_df['MEWS_Score'] * 2 + \
+                                              (60 / (patients_df['Time_Criticality_Min'] + 1))
+        elif 'Derived_Severity' in patients_df.columns:
+            # Try to use derived severity if other metrics not available,
+            # with a middle priority for rows where it is not numeric
+            if not counts['Derived_Severity']['labels']:
+                patients_df['Derived_Severity'] = values['Derived_Severity']
+            if values['Derived_Severity'].notna().any():
+                patients_df['Priority_Score'] = (values['Derived_Severity'] * 10).fillna(50)
+            else:
+                patients_df['Priority_Score'] = 50  # Middle priority
         else:
             # If no suitable metrics available, assign default values
-            self.patients_df['Priority_Score'] = 50  # Middle priority
-            self.patients_df['MEWS_Score'] = self.patients_df.get('MEWS_Score', 2)  # Default moderate score
+            patients_df['Priority_Score'] = 50  # Middle priority
+            patients_df['MEWS_Score'] = patients_df.get('MEWS_Score', 2)  # Default moderate score
+        
+        return patients_df
     
-    def optimize_allocation(self):
-        """Run the optimization model to allocate patients to hospitals."""
-        # Create optimization problem
+    def _locations(self, df, hospitals):
+        """Latitude/longitude of each row of df as an (n, 2) array.
+        
+        Rows without coordinates (or frames without the columns) are placed at the
+        centroid of the hospitals in their region, or of all hospitals.
+        """
+        centroids = hospitals.groupby('Region', observed=True)[COORDINATE_COLUMNS].mean()
+        overall = hospitals[COORDINATE_COLUMNS].mean().to_numpy(dtype=float)
+        
+        fallback = centroids.reindex(df['Region']).to_numpy(dtype=float) if 'Region' in df.columns else \
+            np.full((len(df), 2), np.nan)
+        fallback = np.where(np.isnan(fallback), overall, fallback)
+        if all(c in df.columns for c in COORDINATE_COLUMNS):
+            coordinates = df[COORDINATE_COLUMNS].to_numpy(dtype=float)
+            return np.where(np.isnan(coordinates), fallback, coordinates)
+        return fallback
+    
+    def _travel_minutes(self, origins, hospitals):
+        """Origin x hospital travel times in minutes, or None when hospitals have no coordinates.
+        
+        Times are looked up against all loaded hospitals (travel_destinations) and the
+        requested columns taken from that, so subsets such as one region's hospitals
+        or a residual-capacity copy reuse the same cache file.
+        """
+        if not all(c in hospitals.columns for c in COORDINATE_COLUMNS):
+            return None
+        coordinates = hospitals[COORDINATE_COLUMNS].to_numpy(dtype=float)
+        destinations, columns = coordinates, np.arange(len(hospitals))
+        if self.travel_destinations is not None:
+            positions = self.travel_destinations.index.get_indexer(hospitals.index)
+            if (positions >= 0).all() and np.array_equal(self.travel_destinations.to_numpy()[positions],
+                                                         coordinates, equal_nan=True):
+                destinations, columns = self.travel_destinations.to_numpy(), positions
+        
+        locations, inverse = np.unique(self._locations(origins, hospitals), axis=0, return_inverse=True)
+        matrix = travel_time_matrix(locations, destinations, self.travel_cache_dir, self.travel_speed_kmh)
+        return matrix[inverse.ravel()][:, columns]
+    
+    def _match_factor(self, origins, hospitals):
+        """Objective multiplier for each origin x hospital pair.
+        
+        Without coordinates this is the region factor (region_weight for a same-region
+        hospital, 1 otherwise); with coordinates it decays from region_weight at the
+        door to 1 far away as 1 + (region_weight - 1) * exp(-minutes / travel_time_scale).
+        """
+        travel = self._travel_minutes(origins, hospitals)
+        if travel is None:
+            same_region = origins['Region'].to_numpy()[:, None] == hospitals['Region'].to_numpy()[None, :]
+            return np.where(same_region, self.region_weight, 1.0)
+        return 1.0 + (self.region_weight - 1.0) * np.exp(-travel / self.travel_time_scale)
+    
+    @_phase('build')
+    def _build_allocation_model(self, patients, hospitals):
+        """Build the patient-to-hospital assignment MILP from column-wise arrays.
+        
+        The objective coefficients (Priority_Score x _match_factor) are computed
+        as one NumPy matrix, and pairs that can never be selected (hospital without
+        beds or staff, critical patient at a hospital without ventilators) get no
+        variable at all. Returns the model, a dict of variables keyed by
+        (patient index, hospital index), and the (rows, cols) positions of those
+        variables in insertion order.
+        """
         model = pl.LpProblem("Healthcare_Resource_Allocation", pl.LpMaximize)
         
+        patient_index = patients.index.to_numpy()
+        hospital_index = hospitals.index.to_numpy()
+        
+        # Objective coefficient matrix: patient priority times the region / travel-time factor
+        priority = patients['Priority_Score'].to_numpy(dtype=float)
+        weights = priority[:, None] * self._match_factor(patients, hospitals)
+        
+        # Capacity vectors, one entry per hospital
+        beds = hospitals['Effective_Beds'].to_numpy(dtype=float)
+        feasible = np.repeat((beds >= 1)[None, :], len(patients), axis=0)
+        
+        # Assume each patient needs staff_per_patient (0.5) staff members on average
+        staff_need = self.staff_per_patient
+        staff = None
+        if 'Effective_Staff' in hospitals.columns:
+            staff = hospitals['Effective_Staff'].to_numpy(dtype=float)
+            feasible &= (staff >= staff_need)[None, :]
+        
+        # For critical patients (MEWS >= critical_mews), ensure ventilator availability
+        critical = None
+        if 'MEWS_Score' in patients.columns and 'Ventilators' in hospitals.columns:
+            critical = patients['MEWS_Score'].to_numpy(dtype=float) >= self.critical_mews
+            ventilators = hospitals['Ventilators'].to_numpy(dtype=float)
+            feasible &= ~(critical[:, None] & (ventilators < 1)[None, :])
+        
+        # Decision variables only for the feasible (sparse) part of the grid,
+        # in row-major order so each patient's variables are contiguous
+        rows, cols = np.nonzero(feasible)
+        variables = [pl.LpVariable(f"x_{r}_{c}", cat=pl.LpBinary) for r, c in zip(rows.tolist(), cols.tolist())]
+        x = dict(zip(zip(patient_index[rows].tolist(), hospital_index[cols].tolist()), variables))
+        
+        # Objective function: Maximize weighted sum of patient-hospital assignments
+        model += pl.LpAffineExpression(zip(variables, weights[rows, cols].tolist()))
+        
+        # Constraint 1: Each patient is assigned to at most one hospital
+        patient_bounds = np.searchsorted(rows, np.arange(len(patients) + 1))
+        for start, end in zip(patient_bounds[:-1].tolist(), patient_bounds[1:].tolist()):
+            if end - start > 1:
+                model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in variables[start:end]),
+                                         pl.LpConstraintLE, rhs=1)
+        
+        # Constraints 2-4: bed, staff and ventilator capacity per hospital
+        by_hospital = np.argsort(cols, kind='stable')
+        hospital_bounds = np.searchsorted(cols[by_hospital], np.arange(len(hospitals) + 1))
+        for c in range(len(hospitals)):
+            members = by_hospital[hospital_bounds[c]:hospital_bounds[c + 1]]
+            if len(members) == 0:
+                continue
+            column = [variables[k] for k in members.tolist()]
+            
+            if len(column) > beds[c]:
+                model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in column),
+                                         pl.LpConstraintLE, rhs=beds[c])
+            
+            if staff is not None and staff_need * len(column) > staff[c]:
+                model += pl.LpConstraint(pl.LpAffineExpression((v, staff_need) for v in column),
+                                         pl.LpConstraintLE, rhs=staff[c])
+            
+            if critical is not None:
+                critical_column = [variables[k] for k in members[critical[rows[members]]].tolist()]
+                if len(critical_column) > ventilators[c]:
+                    model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in critical_column),
+                                             pl.LpConstraintLE, rhs=ventilators[c])
+        
+        return model, x, (rows, cols)
+    
+    @_phase('solve')
+    def _solve_with_budget(self, model, time_limit=None, mip_gap=None, warm_start=False):
+        """Solve a PuLP model with quiet CBC under a latency budget and describe the outcome.
+        
+        time_limit is in seconds and mip_gap is the relative gap at which CBC may stop.
+        When the time limit cuts the search short, the incumbent is kept and the solve
+        is flagged as best effort with an unknown gap; has_solution tells whether CBC
+        found any integer solution at all.
+        """
+        log_path = None
+        if self.instrument:
+            # CBC only reports iteration and node counts in its log
+            handle, log_path = tempfile.mkstemp(suffix='.log', prefix='cbc_')
+            os.close(handle)
+        solver = pl.PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapRel=mip_gap, warmStart=warm_start,
+                                 logPath=log_path)
+        
+        start = time.perf_counter()
+        model.solve(solver)
+        wall_time = time.perf_counter() - start
+        
+        optimal = model.sol_status == pl.LpSolutionOptimal
+        has_solution = model.sol_status in (pl.LpSolutionOptimal, pl.LpSolutionIntegerFeasible)
+        info = {
+            'status': pl.LpStatus[model.status],
+            'solution_status': pl.LpSolution[model.sol_status],
+            'best_effort': not optimal,
+            'has_solution': has_solution,
+            'gap': (mip_gap or 0.0) if optimal else None,
+            'objective': pl.value(model.objective) if has_solution else None,
+            'wall_time_s': wall_time,
+            'time_limit_s': time_limit,
+            'mip_gap': mip_gap,
+            'warm_start': warm_start
+        }
+        
+        if log_path is not None:
+            info.update(variables=model.numVariables(), constraints=model.numConstraints(),
+                        nonzeros=sum(len(c) for c in model.constraints.values()))
+            with open(log_path) as f:
+                log = f.read()
+            os.remove(log_path)
+            for key, pattern in [('iterations', r'Total iterations:\s+(\d+)'), ('nodes', r'Enumerated nodes:\s+(\d+)')]:
+                found = re.search(pattern, log)
+                info[key] = int(found.group(1)) if found else None
+        return info
+    
+    def _fallback_info(self, info, fallback_info, engine='flow'):
+        """Describe a solve answered by the fallback engine after CBC found no solution.
+        
+        status, solution_status, best_effort, has_solution, gap and objective are the
+        fallback's; CBC's own outcome is kept under cbc_status / cbc_solution_status.
+        """
+        info = dict(info, cbc_status=info['status'], cbc_solution_status=info['solution_status'],
+                    cbc_wall_time_s=info['wall_time_s'], fallback_engine=engine)
+        info.update({key: fallback_info[key] for key in ('status', 'solution_status', 'best_effort',
+                                                         'has_solution', 'gap', 'objective')})
+        info['wall_time_s'] += fallback_info['wall_time_s']
+        return info
+    
+    def _solve_assignment_milp(self, patients, hospitals, time_limit=None, mip_gap=None, warm_start=False):
+        """Solve the assignment MILP with CBC and return ({patient: hospital}, objective, solve info).
+        
+        With warm_start=True the previous assignment in self.assignment seeds CBC's
+        initial incumbent.
+        """
+        model, x, (rows, cols) = self._build_allocation_model(patients, hospitals)
+        
+        warm_start = bool(warm_start and self.assignment)
+        if warm_start:
+            for i, j in self.assignment.items():
+                if (i, j) in x:
+                    x[i, j].setInitialValue(1)
+        
+        # Solve the model
+        info = self._solve_with_budget(model, time_limit, mip_gap, warm_start)
+        
+        if not info['has_solution']:
+            # No incumbent within the budget, use the exact flow answer instead
+            print("Warning: CBC found no integer solution within the time limit, falling back to the flow engine")
+            assignment, objective, flow_info = self._solve_assignment_flow(patients, hospitals)
+            return assignment, objective, self._fallback_info(info, flow_info)
+        
+        # Read the solution vector in one pass and keep the selected pairs
+        values = np.fromiter((var.varValue or 0.0 for var in x.values()), dtype=float, count=len(x))
+        chosen = values > 0.5
+        assignment = dict(zip(patients.index.to_numpy()[rows[chosen]].tolist(),
+                              hospitals.index.to_numpy()[cols[chosen]].tolist()))
+        return assignment, info['objective'] or 0.0, info
+    
+    @_phase('solve')
+    def _solve_assignment_flow(self, patients, hospitals):
+        """Solve the assignment as a min-cost flow over region x criticality classes.
+        
+        The objective only depends on a patient's priority and whether the hospital is
+        in the patient's region, so patients are bucketed into (region, critical) classes
+        and each class is fed into the network through one arc per distinct priority
+        value. A second set of arcs of the same cost into a "same region" node pays the
+        regional bonus, and ventilator limits become gate arcs in front of each hospital.
+        The network has integral capacities, so network simplex returns an optimal
+        integral assignment that matches the MILP objective. Returns
+        ({patient: hospital}, objective, solve info).
+        """
+        import networkx as nx
+        
+        if all(c in hospitals.columns for c in COORDINATE_COLUMNS):
+            print("Warning: The flow engine ignores travel times and uses the region factor")
+        
+        start = time.perf_counter()
+        
+        patient_index = patients.index.to_numpy()
+        hospital_index = hospitals.index.to_numpy()
+        n_patients = len(patients)
+        
+        priority = patients['Priority_Score'].to_numpy(dtype=float)
+        patient_region = patients['Region'].to_numpy()
+        hospital_region = hospitals['Region'].to_numpy()
+        
+        # Patients a hospital can take: beds, and staff_per_patient staff members per patient
+        capacity = np.floor(hospitals['Effective_Beds'].to_numpy(dtype=float))
+        if 'Effective_Staff' in hospitals.columns and self.staff_per_patient > 0:
+            capacity = np.minimum(capacity, np.floor(hospitals['Effective_Staff'].to_numpy(dtype=float) /
+                                                     self.staff_per_patient))
+        capacity = np.maximum(np.nan_to_num(capacity), 0).astype(int)
+        
+        # Critical patients (MEWS >= critical_mews) additionally need a ventilator
+        critical = np.zeros(n_patients, dtype=bool)
+        ventilators = None
+        if 'MEWS_Score' in patients.columns and 'Ventilators' in hospitals.columns:
+            critical = patients['MEWS_Score'].to_numpy(dtype=float) >= self.critical_mews
+            ventilators = np.maximum(np.nan_to_num(np.floor(hospitals['Ventilators'].to_numpy(dtype=float))), 0).astype(int)
+        
+        G = nx.MultiDiGraph()
+        G.add_node('source', demand=-n_patients)
+        G.add_node('sink', demand=n_patients)
+        G.add_edge('source', 'sink', capacity=n_patients, weight=0)  # unassigned patients
+        
+        for h in range(len(hospitals)):
+            G.add_edge(('hospital', h), 'sink', capacity=int(capacity[h]), weight=0)
+            if ventilators is not None:
+                G.add_edge(('ventilator', h), ('hospital', h), capacity=int(ventilators[h]), weight=0)
+        
+        # Patients of each class, sorted by descending priority. Classes are visited in
+        # data order: the insertion order of nodes and arcs decides how network simplex
+        # breaks ties, so hash-ordered sets would change the assignment between runs
+        classes = {}
+        for region, is_critical in dict.fromkeys(zip(patient_region.tolist(), critical.tolist())):
+            members = np.flatnonzero((patient_region == region) & (critical == is_critical))
+            members = members[np.argsort(-priority[members], kind='stable')]
+            classes[(region, is_critical)] = members
+            
+            values, counts = np.unique(priority[members], return_counts=True)
+            costs = [-int(round(v * FLOW_COST_SCALE)) for v in values.tolist()]
+            bonuses = [-int(round(v * (self.region_weight - 1) * FLOW_COST_SCALE)) for v in values.tolist()]
+            same_region = hospital_region == region
+            
+            for cost, bonus, count in zip(costs, bonuses, counts.tolist()):
+                G.add_edge('source', ('all', region, is_critical), capacity=count, weight=cost)
+                if same_region.any():
+                    G.add_edge(('all', region, is_critical), ('same', region, is_critical), capacity=count, weight=bonus)
+            
+            gate = 'ventilator' if is_critical and ventilators is not None else 'hospital'
+            for h in range(len(hospitals)):
+                origin = 'same' if same_region[h] else 'all'
+                G.add_edge((origin, region, is_critical), (gate, h), capacity=len(members), weight=0)
+        
+        _, flow = nx.network_simplex(G)
+        
+        # Hand out hospitals within each class: same-region slots go to the highest
+        # priorities, cross-region slots to the next ones
+        assigned = np.full(n_patients, -1)
+        for (region, is_critical), members in classes.items():
+            gate = 'ventilator' if is_critical and ventilators is not None else 'hospital'
+            slots = []
+            for origin in ('same', 'all'):
+                for target, arcs in flow.get((origin, region, is_critical), {}).items():
+                    if target[0] == gate:
+                        slots.extend([target[1]] * int(round(sum(arcs.values()))))
+            assigned[members[:len(slots)]] = slots
+        
+        matched = assigned >= 0
+        objective = float(np.sum(priority[matched] *
+                                 np.where(patient_region[matched] == hospital_region[assigned[matched]],
+                                          self.region_weight, 1.0)))
+        assignment = dict(zip(patient_index[matched].tolist(), hospital_index[assigned[matched]].tolist()))
+        info = {
+            'status': 'Optimal',
+            'solution_status': 'Optimal Solution Found',
+            'best_effort': False,
+            'has_solution': True,
+            'gap': 0.0,
+            'objective': objective,
+            'wall_time_s': time.perf_counter() - start
+        }
+        return assignment, objective, info
+    
+    def optimize_allocation(self, engine='milp', check_gap=None, time_limit=None, mip_gap=None, warm_start=False,
+                            decompose=False, max_workers=None):
+        """Run the optimization model to allocate patients to hospitals.
+        
+        engine selects the solver: 'milp' solves the binary model with CBC, 'flow'
+        solves the same problem as a min-cost flow over patient classes. With
+        check_gap=True a non-MILP engine (or a decomposed solve) is compared against
+        CBC on small instances and the result is stored in self.gap_check. time_limit
+        (seconds), mip_gap and warm_start (seed CBC with the previous assignment)
+        bound the MILP solve; its status, gap and wall time are stored in
+        self.solve_info['allocation']. decompose=True solves each region separately
+        in up to max_workers processes (see _solve_assignment_decomposed). With
+        hospital coordinates the travel-time factor couples regions, so a decomposed
+        solve warns and check_gap defaults to True for it.
+        """
+        if engine not in ALLOCATION_ENGINES:
+            raise ValueError(f"Unknown allocation engine '{engine}', expected one of {ALLOCATION_ENGINES}")
+        
         # Get relevant data
         patients = self.patients_df
         hospitals = self.hospitals_df
@@ -106,83 +837,759 @@ class HealthcareResourceAllocator:
             default_region = hospitals['Region'].iloc[0] if not hospitals.empty else "Unknown"
             patients['Region'] = default_region
         
-        # Create decision variables
-        # x[i,j] = 1 if patient i is assigned to hospital j, 0 otherwise
-        x = pl.LpVariable.dicts("patient_assignment", 
-                              [(i, j) for i in patients.index for j in hospitals.index],
-                              cat=pl.LpBinary)
+        if decompose and self.travel_destinations is not None:
+            # Region blocks are only nearly independent under the region bonus
+            print("Warning: Hospitals have coordinates, so travel times couple the regions and the "
+                  "decomposed solve can fall well short of the full model")
+            check_gap = True if check_gap is None else check_gap
         
-        # Objective function: Maximize weighted sum of patient-hospital assignments
-        # Weight includes patient priority and regional matching
-        objective = pl.lpSum([x[i,j] * patients.loc[i, 'Priority_Score'] * 
-                            (2 if patients.loc[i, 'Region'] == hospitals.loc[j, 'Region'] else 1)
-                            for i in patients.index for j in hospitals.index])
-        model += objective
+        if decompose:
+            assignment, objective, info = self._solve_assignment_decomposed(patients, hospitals, engine,
+                                                                            time_limit=time_limit, mip_gap=mip_gap,
+                                                                            max_workers=max_workers)
+        else:
+            assignment, objective, info = self._solve_assignment(patients, hospitals, engine,
+                                                                 time_limit=time_limit, mip_gap=mip_gap,
+                                                                 warm_start=warm_start)
+        self.allocation_objective = objective
+        self.solve_info['allocation'] = dict(info, engine=engine)
         
-        # Constraint 1: Each patient is assigned to at most one hospital
-        for i in patients.index:
-            model += pl.lpSum([x[i,j] for j in hospitals.index]) <= 1
+        self.gap_check = None
+        if check_gap and (engine != 'milp' or decompose):
+            if len(patients) * len(hospitals) <= GAP_CHECK_MAX_PAIRS:
+                _, milp_objective, _ = self._solve_assignment_milp(patients, hospitals)
+                self.gap_check = {
+                    'engine': f"{engine} (decomposed)" if decompose else engine,
+                    'engine_objective': objective,
+                    'milp_objective': milp_objective,
+                    'gap': (milp_objective - objective) / abs(milp_objective) if milp_objective else 0.0
+                }
+                if decompose and self.gap_check['gap'] > DECOMPOSE_GAP_WARNING:
+                    print(f"Warning: Decomposed objective is {self.gap_check['gap']:.1%} below the full MILP")
+            else:
+                print(f"Warning: Skipping gap check, {len(patients) * len(hospitals)} pairs exceeds {GAP_CHECK_MAX_PAIRS}")
+        
+        # Keep the assignment and residual capacities for incremental updates
+        self.assignment = assignment
+        self._reset_residual_capacity()
+        
+        self.allocation_results = self._allocation_rows(patients, hospitals, assignment)
+        self.allocation_results.attrs['solve_info'] = self.solve_info['allocation']
+        return self.allocation_results
+    
+    def _solve_assignment(self, patients, hospitals, engine, time_limit=None, mip_gap=None, warm_start=False):
+        """Dispatch an assignment problem to the selected engine."""
+        if engine == 'flow':
+            return self._solve_assignment_flow(patients, hospitals)
+        return self._solve_assignment_milp(patients, hospitals, time_limit, mip_gap, warm_start)
+    
+    def _solve_assignment_decomposed(self, patients, hospitals, engine, time_limit=None, mip_gap=None,
+                                     max_workers=None):
+        """Solve the assignment region by region, then place the overflow across regions.
+        
+        Same-region matches carry the higher weight, so the full model is close to
+        block-diagonal by Region. Each region's patients are first solved against that
+        region's hospitals in parallel worker processes (in-process with max_workers=1).
+        A coordination pass then assigns the patients left over, including those from
+        regions without hospitals, against the residual capacity of every hospital.
+        status, solution_status and best_effort aggregate the parts' solves, so a
+        region cut short by time_limit marks the whole solve as best effort; the
+        combination itself is not guaranteed optimal for the full model, so gap stays
+        unknown and decomposed=True records it (check_gap measures it). Returns ({patient: hospital},
+        objective, solve info).
+        """
+        start = time.perf_counter()
+        settings = {key: getattr(self, key) for key in SOLVER_SETTINGS}
+        
+        patient_region = patients['Region'].to_numpy()
+        hospital_region = hospitals['Region'].to_numpy()
+        regions = [r for r in pd.unique(patient_region) if (hospital_region == r).any()]
+        subproblems = {r: (patients[patient_region == r], hospitals[hospital_region == r]) for r in regions}
+        
+        if max_workers == 1 or len(regions) <= 1:
+            solved = {r: _solve_region(settings, p, h, engine, time_limit, mip_gap) for r, (p, h) in subproblems.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or min(len(regions), os.cpu_count() or 1)) as pool:
+                futures = {r: pool.submit(_solve_region, settings, p, h, engine, time_limit, mip_gap)
+                           for r, (p, h) in subproblems.items()}
+                solved = {r: future.result() for r, future in futures.items()}
+        
+        assignment = {}
+        for regional_assignment, _, _ in solved.values():
+            assignment.update(regional_assignment)
+        
+        # Coordination pass: leftover patients against what every hospital has left
+        usage = self._capacity_usage(patients, assignment).reindex(hospitals.index, fill_value=0.0)
+        residual = hospitals.copy()
+        residual['Effective_Beds'] = (hospitals['Effective_Beds'] - usage['Beds']).clip(lower=0)
+        if 'Effective_Staff' in residual.columns:
+            residual['Effective_Staff'] = (hospitals['Effective_Staff'] - usage['Staff']).clip(lower=0)
+        if 'Ventilators' in residual.columns:
+            residual['Ventilators'] = (hospitals['Ventilators'] - usage['Ventilators']).clip(lower=0)
+        
+        overflow = patients[~patients.index.isin(list(assignment))]
+        overflow_info = None
+        if len(overflow) > 0 and (residual['Effective_Beds'] >= 1).any():
+            overflow_assignment, _, overflow_info = self._solve_assignment(overflow, residual, engine,
+                                                                           time_limit=time_limit, mip_gap=mip_gap)
+            assignment.update(overflow_assignment)
         
-        # Constraint 2: Hospital bed capacity
-        for j in hospitals.index:
-            model += pl.lpSum([x[i,j] for i in patients.index]) <= hospitals.loc[j, 'Effective_Beds']
+        # Objective of the combined assignment under the full model's weights
+        objective = 0.0
+        if assignment:
+            assigned = pd.Series(assignment)
+            rows = patients.index.get_indexer(assigned.index)
+            cols = hospitals.index.get_indexer(assigned.to_numpy())
+            factor = self._match_factor(patients.iloc[rows], hospitals)[np.arange(len(rows)), cols]
+            objective = float(np.sum(patients['Priority_Score'].to_numpy(dtype=float)[rows] * factor))
         
-        # Constraint 3: Hospital staff capacity
-        # Assume each patient needs 0.5 staff members on average
+        parts = [info for _, _, info in solved.values()] + ([overflow_info] if overflow_info else [])
+        best_effort = any(p['best_effort'] for p in parts)
+        # A part that stopped early decides the solution status of the whole
+        solution_status = next((p['solution_status'] for p in parts if p['best_effort']),
+                               'Optimal Solution Found')
+        info = {
+            'status': 'Optimal' if all(p['status'] == 'Optimal' for p in parts) else 'Not Solved',
+            'solution_status': solution_status,
+            'best_effort': best_effort,
+            'has_solution': True,
+            'gap': None,
+            'objective': objective,
+            'wall_time_s': time.perf_counter() - start,
+            'decomposed': True,
+            'regions': {r: info for r, (_, _, info) in solved.items()},
+            'overflow': dict(overflow_info, patients=len(overflow)) if overflow_info else {'patients': len(overflow)}
+        }
+        return assignment, objective, info
+    
+    @_phase('extract')
+    def _allocation_rows(self, patients, hospitals, assignment):
+        """Build allocation_results rows for the given patients from a {patient: hospital} mapping."""
+        # Position of each patient's hospital in the hospitals frame, -1 if unassigned
+        position = np.full(len(patients), -1)
+        if assignment:
+            assigned = pd.Series(assignment)
+            rows = patients.index.get_indexer(assigned.index)
+            keep = rows >= 0
+            position[rows[keep]] = hospitals.index.get_indexer(assigned.to_numpy()[keep])
+        matched = position >= 0
+        
+        if 'Name' in hospitals.columns:
+            hospital_names = hospitals['Name'].to_numpy(dtype=object)
+        else:
+            hospital_names = np.array([f"Hospital_{j}" for j in hospitals.index], dtype=object)
+        
+        # Regions as codes into one shared category list, hospitals' regions first
+        hospital_regions = hospitals['Region'].to_numpy(dtype=object)
+        patient_regions = patients['Region'].to_numpy(dtype=object)
+        regions = pd.Index(pd.unique(np.concatenate([hospital_regions, patient_regions]))).dropna()
+        hospital_region_codes = regions.get_indexer(hospital_regions)
+        patient_region_codes = regions.get_indexer(patient_regions)
+        assigned_region_codes = np.where(matched, hospital_region_codes[np.maximum(position, 0)], -1)
+        
+        allocation_results = pd.DataFrame(index=patients.index)
+        allocation_results['Patient_ID'] = patients['Patient ID'] if 'Patient ID' in patients.columns else patients.index
+        allocation_results['Patient_Name'] = patients['Patient Name'] if 'Patient Name' in patients.columns else \
+            [f"Patient_{i}" for i in patients.index]
+        allocation_results['Priority_Score'] = patients['Priority_Score']
+        allocation_results['Patient_Region'] = pd.Categorical.from_codes(patient_region_codes, categories=regions)
+        
+        # Add MEWS Score if available
+        if 'MEWS_Score' in patients.columns:
+            allocation_results['MEWS_Score'] = patients['MEWS_Score']
+        
+        # The assigned hospital is stored as its position in hospitals_df ('Unassigned'
+        # is the last category), so names are only materialized on export
+        allocation_results['Assigned_Hospital'] = self._hospital_categorical(position, hospital_names)
+        allocation_results['Hospital_Region'] = pd.Categorical.from_codes(assigned_region_codes, categories=regions)
+        allocation_results['Is_Regional_Match'] = matched & (patient_region_codes == assigned_region_codes)
+        
+        # Travel time to the assigned hospital when hospitals have coordinates
+        travel = self._travel_minutes(patients, hospitals)
+        if travel is not None:
+            minutes = np.full(len(patients), np.nan)
+            minutes[matched] = travel[np.flatnonzero(matched), position[matched]]
+            allocation_results['Travel_Minutes'] = minutes
+        
+        return allocation_results
+    
+    def _hospital_categorical(self, position, hospital_names):
+        """Categorical of hospital names from int positions (-1 = 'Unassigned')."""
+        categories = pd.Index(hospital_names).append(pd.Index(['Unassigned']))
+        if not categories.is_unique:
+            # Duplicate hospital names cannot be categories, keep plain strings
+            return np.where(position >= 0, hospital_names[np.maximum(position, 0)], 'Unassigned')
+        codes = np.where(position >= 0, position, len(hospital_names)).astype(np.int32)
+        return pd.Categorical.from_codes(codes, categories=categories)
+    
+    def _compact_results(self, results):
+        """Restore the categorical encodings of allocation_results after a concat mixed categories."""
+        for col in ['Patient_Region', 'Hospital_Region']:
+            if not isinstance(results[col].dtype, pd.CategoricalDtype):
+                results[col] = results[col].astype('category')
+        if not isinstance(results['Assigned_Hospital'].dtype, pd.CategoricalDtype):
+            names = self.hospitals_df['Name'] if 'Name' in self.hospitals_df.columns else \
+                pd.Index([f"Hospital_{j}" for j in self.hospitals_df.index])
+            position = pd.Index(names).get_indexer(results['Assigned_Hospital'])
+            results['Assigned_Hospital'] = self._hospital_categorical(position, np.asarray(names, dtype=object))
+        return results
+    
+    def assigned_hospital_index(self):
+        """int32 position of each allocation_results row's hospital in hospitals_df, -1 when unassigned."""
+        if self.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
+        assigned = self.allocation_results['Assigned_Hospital']
+        if isinstance(assigned.dtype, pd.CategoricalDtype):
+            codes = assigned.cat.codes.to_numpy().astype(np.int32)
+            return np.where(codes >= len(self.hospitals_df), -1, codes).astype(np.int32)
+        names = self.hospitals_df['Name'] if 'Name' in self.hospitals_df.columns else \
+            pd.Index([f"Hospital_{j}" for j in self.hospitals_df.index])
+        return pd.Index(names).get_indexer(assigned).astype(np.int32)
+    
+    def _capacity_usage(self, patients, assignment):
+        """Count beds, staff and ventilators used per hospital by a {patient: hospital} mapping."""
+        usage = pd.DataFrame(0.0, index=self.hospitals_df.index, columns=['Beds', 'Staff', 'Ventilators'])
+        if not assignment:
+            return usage
+        
+        assigned = pd.Series(assignment)
+        usage['Beds'] = assigned.value_counts().reindex(usage.index, fill_value=0).astype(float)
+        usage['Staff'] = usage['Beds'] * self.staff_per_patient
+        if 'MEWS_Score' in patients.columns:
+            critical = patients.loc[assigned.index, 'MEWS_Score'].to_numpy(dtype=float) >= self.critical_mews
+            usage['Ventilators'] = assigned[critical].value_counts().reindex(usage.index, fill_value=0).astype(float)
+        return usage
+    
+    def _reset_residual_capacity(self):
+        """Recompute residual hospital capacity from the current assignment."""
+        hospitals = self.hospitals_df
+        residual = pd.DataFrame(index=hospitals.index)
+        residual['Beds'] = hospitals['Effective_Beds'].astype(float)
+        residual['Staff'] = hospitals['Effective_Staff'].astype(float) if 'Effective_Staff' in hospitals.columns else np.inf
+        residual['Ventilators'] = hospitals['Ventilators'].astype(float) if 'Ventilators' in hospitals.columns else np.inf
+        self.residual_capacity = residual - self._capacity_usage(self.patients_df, self.assignment)
+    
+    def _residual_hospitals(self):
+        """Return a copy of hospitals_df whose capacity columns hold the residual capacity."""
+        hospitals = self.hospitals_df.copy()
+        hospitals['Effective_Beds'] = self.residual_capacity['Beds'].clip(lower=0)
         if 'Effective_Staff' in hospitals.columns:
-            for j in hospitals.index:
-                model += pl.lpSum([x[i,j] * 0.5 for i in patients.index]) <= hospitals.loc[j, 'Effective_Staff']
+            hospitals['Effective_Staff'] = self.residual_capacity['Staff'].clip(lower=0)
+        if 'Ventilators' in hospitals.columns:
+            hospitals['Ventilators'] = self.residual_capacity['Ventilators'].clip(lower=0)
+        return hospitals
+    
+    def add_patients(self, new_patients, engine='milp', max_reshuffle=0, time_limit=None, mip_gap=None):
+        """Allocate newly arriving patients against the residual hospital capacity.
         
-        # Constraint 4: Ensure hospitals have necessary equipment for critical patients
-        # For critical patients (MEWS >= 5), ensure ventilator availability
-        if 'MEWS_Score' in patients.columns and 'Ventilators' in hospitals.columns:
-            critical_patients = [i for i in patients.index if patients.loc[i, 'MEWS_Score'] >= 5]
-            for j in hospitals.index:
-                model += pl.lpSum([x[i,j] for i in critical_patients]) <= hospitals.loc[j, 'Ventilators']
+        Only the new patients are solved; existing assignments are kept. With
+        max_reshuffle > 0, up to that many already-assigned patients whose priority is
+        below the most urgent arrival are released and re-solved together with the
+        new patients. Returns the allocation_results rows that changed.
+        """
+        if self.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
         
-        # Solve the model
-        model.solve()
-        
-        # Extract results
-        allocation_results = []
-        for i in patients.index:
-            assigned_hospital = None
-            for j in hospitals.index:
-                if pl.value(x[i,j]) == 1:
-                    assigned_hospital = j
-                    break
-            
-            result_row = {
-                'Patient_ID': patients.loc[i, 'Patient ID'] if 'Patient ID' in patients.columns else i,
-                'Patient_Name': patients.loc[i, 'Patient Name'] if 'Patient Name' in patients.columns else f"Patient_{i}",
-                'Priority_Score': patients.loc[i, 'Priority_Score'],
-                'Patient_Region': patients.loc[i, 'Region']
-            }
-            
-            # Add MEWS Score if available
-            if 'MEWS_Score' in patients.columns:
-                result_row['MEWS_Score'] = patients.loc[i, 'MEWS_Score']
-            
-            if assigned_hospital is not None:
-                result_row.update({
-                    'Assigned_Hospital': hospitals.loc[assigned_hospital, 'Name'] if 'Name' in hospitals.columns else f"Hospital_{assigned_hospital}",
-                    'Hospital_Region': hospitals.loc[assigned_hospital, 'Region'],
-                    'Is_Regional_Match': patients.loc[i, 'Region'] == hospitals.loc[assigned_hospital, 'Region']
-                })
-            else:
-                result_row.update({
-                    'Assigned_Hospital': 'Unassigned',
-                    'Hospital_Region': None,
-                    'Is_Regional_Match': False
-                })
-                
-            allocation_results.append(result_row)
+        new_patients = self._preprocess_patients(pd.DataFrame(new_patients).copy())
+        start = self.patients_df.index.max() + 1 if len(self.patients_df) > 0 else 0
+        new_patients.index = pd.RangeIndex(start, start + len(new_patients))
+        if 'Region' not in new_patients.columns:
+            new_patients['Region'] = self.hospitals_df['Region'].iloc[0] if not self.hospitals_df.empty else "Unknown"
+        
+        # Release the lowest-priority assigned patients that an arrival outranks
+        released = {}
+        if max_reshuffle > 0 and self.assignment and len(new_patients) > 0:
+            assigned_priority = self.patients_df.loc[list(self.assignment), 'Priority_Score']
+            candidates = assigned_priority[assigned_priority < new_patients['Priority_Score'].max()]
+            for i in candidates.nsmallest(max_reshuffle).index:
+                released[i] = self.assignment.pop(i)
+            self.residual_capacity += self._capacity_usage(self.patients_df, released)
+        
+        self.patients_df = pd.concat([self.patients_df, new_patients])
+        delta = self.patients_df.loc[list(released) + list(new_patients.index)]
+        
+        assignment, _, info = self._solve_assignment(delta, self._residual_hospitals(), engine,
+                                                     time_limit=time_limit, mip_gap=mip_gap)
+        self.solve_info['incremental'] = dict(info, engine=engine, patients=len(delta))
+        self.assignment.update(assignment)
+        self.residual_capacity -= self._capacity_usage(delta, assignment)
+        
+        delta_results = self._allocation_rows(delta, self.hospitals_df, assignment)
+        self.allocation_results = self._compact_results(pd.concat([
+            self.allocation_results.drop(index=list(released)),
+            delta_results
+        ]).reindex(self.patients_df.index))
+        return delta_results
+    
+    def discharge_patients(self, patient_ids):
+        """Remove discharged patients and return their capacity to the residual pool."""
+        if self.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
+        
+        if 'Patient ID' in self.patients_df.columns:
+            labels = self.patients_df.index[self.patients_df['Patient ID'].isin(patient_ids)]
+        else:
+            labels = self.patients_df.index.intersection(patient_ids)
+        
+        discharged = {i: self.assignment.pop(i) for i in labels if i in self.assignment}
+        self.residual_capacity += self._capacity_usage(self.patients_df, discharged)
+        
+        self.patients_df = self.patients_df.drop(index=labels)
+        self.allocation_results = self.allocation_results.drop(index=labels)
+        return len(labels)
+    
+    def _forecast_classes(self, forecast, horizon=None):
+        """Expand an arrival forecast into (period, region, critical) classes.
+        
+        forecast needs Period, Region and Arrivals columns. Critical_Arrivals and
+        Priority_Score are optional; when missing, the critical share and the expected
+        priority of each region are estimated from the current patients.
+        """
+        forecast = pd.DataFrame(forecast)
+        missing = [c for c in ('Period', 'Region', 'Arrivals') if c not in forecast.columns]
+        if missing:
+            raise ValueError(f"Forecast is missing columns: {missing}")
+        
+        forecast = forecast[forecast['Period'] >= 1]
+        if horizon is not None:
+            forecast = forecast[forecast['Period'] <= horizon]
+        forecast = forecast.groupby(['Period', 'Region'], as_index=False).agg(
+            {c: 'sum' if c != 'Priority_Score' else 'mean' for c in forecast.columns
+             if c in ('Arrivals', 'Critical_Arrivals', 'Priority_Score')})
+        
+        patients = self.patients_df
+        critical = patients['MEWS_Score'].to_numpy(dtype=float) >= self.critical_mews \
+            if 'MEWS_Score' in patients.columns else np.zeros(len(patients), dtype=bool)
+        history = pd.DataFrame({'Region': patients['Region'].to_numpy(), 'Critical': critical,
+                                'Priority_Score': patients['Priority_Score'].to_numpy(dtype=float)})
+        
+        if 'Critical_Arrivals' not in forecast.columns:
+            share = history.groupby('Region')['Critical'].mean()
+            overall_share = history['Critical'].mean() if len(history) else 0.0
+            forecast['Critical_Arrivals'] = forecast['Arrivals'] * forecast['Region'].map(share).fillna(overall_share)
+        forecast['Critical_Arrivals'] = np.minimum(forecast['Critical_Arrivals'], forecast['Arrivals'])
+        
+        classes = pd.concat([
+            forecast.assign(Critical=True, Expected=forecast['Critical_Arrivals']),
+            forecast.assign(Critical=False, Expected=forecast['Arrivals'] - forecast['Critical_Arrivals'])
+        ], ignore_index=True)
+        classes = classes[classes['Expected'] > 0].reset_index(drop=True)
+        
+        # Expected priority per class: forecast value, else region/criticality mean of today's patients
+        by_class = history.groupby(['Region', 'Critical'])['Priority_Score'].mean()
+        by_critical = history.groupby('Critical')['Priority_Score'].mean()
+        estimate = by_class.reindex(pd.MultiIndex.from_frame(classes[['Region', 'Critical']])).to_numpy()
+        estimate = np.where(np.isnan(estimate), classes['Critical'].map(by_critical).to_numpy(dtype=float), estimate)
+        estimate = np.nan_to_num(estimate, nan=history['Priority_Score'].mean() if len(history) else 50.0)
+        if 'Priority_Score' in classes.columns:
+            estimate = classes['Priority_Score'].fillna(pd.Series(estimate)).to_numpy(dtype=float)
+        classes['Priority_Score'] = estimate
+        return classes[['Period', 'Region', 'Critical', 'Expected', 'Priority_Score']]
+    
+    def plan_rolling_horizon(self, forecast, horizon=None, release_rate=0.1, discount=0.9,
+                             time_limit=None, mip_gap=None):
+        """Assign current patients while reserving capacity for forecasted arrivals.
+        
+        Period 0 is the current snapshot; forecast gives the expected arrivals per
+        region for periods 1..horizon (see _forecast_classes). Occupied beds, staff and
+        ventilators are released at release_rate per period, both for the patients
+        already in hospital (Current_Patients) and for the ones placed by the plan.
+        Forecasted arrivals enter the objective with their expected Priority_Score,
+        the usual region factor and discount ** period, so capacity is held back for
+        a surge of critical arrivals instead of being filled by low-priority patients
+        now.
+        
+        Only the period-0 assignment is committed; the planned placements of future
+        arrivals are stored in self.reservations. Re-run as time advances (after
+        add_patients / discharge_patients) to roll the horizon forward.
+        """
+        if not 0 <= release_rate <= 1:
+            raise ValueError("release_rate must be between 0 and 1")
+        
+        patients = self.patients_df
+        hospitals = self.hospitals_df
+        
+        # Ensure 'Region' column exists in patients DataFrame
+        if 'Region' not in patients.columns:
+            default_region = hospitals['Region'].iloc[0] if not hospitals.empty else "Unknown"
+            patients['Region'] = default_region
+        
+        classes = self._forecast_classes(forecast, horizon)
+        periods = np.arange(1, int(classes['Period'].max()) + 1) if len(classes) else np.array([], dtype=int)
+        
+        # Period 0: the regular snapshot model over the current patients
+        model, x, (rows, cols) = self._build_allocation_model(patients, hospitals)
+        current = list(x.values())
+        critical = patients['MEWS_Score'].to_numpy(dtype=float)[rows] >= self.critical_mews \
+            if 'MEWS_Score' in patients.columns else \
+            np.zeros(len(rows), dtype=bool)
+        
+        # Forecast placements: expected arrivals of each class at each hospital
+        n_classes, n_hospitals = len(classes), len(hospitals)
+        weights = (classes['Priority_Score'].to_numpy(dtype=float) *
+                   discount ** classes['Period'].to_numpy(dtype=float))[:, None] * self._match_factor(classes, hospitals)
+        planned = [[pl.LpVariable(f"f_{k}_{h}", lowBound=0) for h in range(n_hospitals)] for k in range(n_classes)]
+        
+        # Planned arrivals are only worth their expected priority, never more than forecast
+        model.objective += pl.LpAffineExpression(
+            (planned[k][h], weights[k, h]) for k in range(n_classes) for h in range(n_hospitals))
+        expected = classes['Expected'].to_numpy(dtype=float)
+        for k in range(n_classes):
+            model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in planned[k]),
+                                     pl.LpConstraintLE, rhs=expected[k])
+        
+        # Capacity released over time by patients already in hospital
+        beds = hospitals['Effective_Beds'].to_numpy(dtype=float)
+        staff = hospitals['Effective_Staff'].to_numpy(dtype=float) if 'Effective_Staff' in hospitals.columns else None
+        ventilators = hospitals['Ventilators'].to_numpy(dtype=float) if 'Ventilators' in hospitals.columns else None
+        if 'Current_Patients' in hospitals.columns:
+            occupied = hospitals['Current_Patients'].fillna(0).to_numpy(dtype=float)
+        else:
+            occupied = np.zeros(n_hospitals)
+        
+        class_period = classes['Period'].to_numpy()
+        class_critical = classes['Critical'].to_numpy(dtype=bool)
+        by_hospital = [np.flatnonzero(cols == h) for h in range(n_hospitals)]
+        for t in periods:
+            # Fraction still in hospital at period t, for today's patients and each class
+            now = (1 - release_rate) ** t
+            stay = (1 - release_rate) ** (t - class_period)
+            released = 1 - now
+            active = np.flatnonzero(class_period <= t)
+            for h in range(n_hospitals):
+                # Expected occupancy at period t of everyone the plan places at hospital h
+                terms = [(current[k], now) for k in by_hospital[h].tolist()] + \
+                        [(planned[k][h], stay[k]) for k in active.tolist()]
+                if not terms:
+                    continue
+                model += pl.LpConstraint(pl.LpAffineExpression(terms), pl.LpConstraintLE,
+                                         rhs=beds[h] + occupied[h] * released)
+                if staff is not None:
+                    model += pl.LpConstraint(pl.LpAffineExpression((v, self.staff_per_patient * a) for v, a in terms),
+                                             pl.LpConstraintLE,
+                                             rhs=staff[h] + self.staff_per_patient * occupied[h] * released)
+                if ventilators is not None:
+                    critical_terms = [(current[k], now) for k in by_hospital[h][critical[by_hospital[h]]].tolist()] + \
+                                     [(planned[k][h], stay[k]) for k in active[class_critical[active]].tolist()]
+                    if critical_terms:
+                        model += pl.LpConstraint(pl.LpAffineExpression(critical_terms), pl.LpConstraintLE,
+                                                 rhs=ventilators[h])
         
-        self.allocation_results = pd.DataFrame(allocation_results)
+        info = self._solve_with_budget(model, time_limit, mip_gap)
+        info.update(engine='milp', periods=len(periods), release_rate=release_rate, discount=discount)
+        
+        if info['has_solution']:
+            values = np.fromiter((v.varValue or 0.0 for v in current), dtype=float, count=len(current))
+            chosen = values > 0.5
+            assignment = dict(zip(patients.index.to_numpy()[rows[chosen]].tolist(),
+                                  hospitals.index.to_numpy()[cols[chosen]].tolist()))
+            plan = np.array([[v.varValue or 0.0 for v in row] for row in planned]).reshape(n_classes, n_hospitals)
+        else:
+            # No incumbent within the budget, fall back to the snapshot plan without reservations
+            print("Warning: CBC found no integer solution within the time limit, falling back to the flow engine")
+            assignment, objective, flow_info = self._solve_assignment_flow(patients, hospitals)
+            # The snapshot is solved exactly, but the horizon (reservations) is not
+            info = self._fallback_info(info, dict(flow_info, best_effort=True, gap=None))
+            plan = np.zeros((n_classes, n_hospitals))
+        
+        # Planned placements of forecasted arrivals, one row per class and hospital
+        k_idx, h_idx = np.nonzero(plan > 1e-9)
+        hospital_names = hospitals['Name'].to_numpy(dtype=object) if 'Name' in hospitals.columns else \
+            np.array([f"Hospital_{j}" for j in hospitals.index], dtype=object)
+        self.reservations = pd.DataFrame({
+            'Period': class_period[k_idx],
+            'Region': classes['Region'].to_numpy(dtype=object)[k_idx],
+            'Critical': class_critical[k_idx],
+            'Hospital': hospital_names[h_idx],
+            'Planned_Arrivals': plan[k_idx, h_idx]
+        })
+        
+        self.allocation_objective = info['objective']
+        self.solve_info['rolling_horizon'] = info
+        self.gap_check = None
+        self.assignment = assignment
+        self._reset_residual_capacity()
+        
+        self.allocation_results = self._allocation_rows(patients, hospitals, assignment)
+        self.allocation_results.attrs['solve_info'] = info
+        self.allocation_results.attrs['reservations'] = self.reservations
         return self.allocation_results
     
-    def allocate_supplier_resources(self):
-        """Allocate supplier resources to hospitals based on need."""
+    def _pareto_point(self, patients, hospitals, values, rows, cols, weights, capacity, occupied, burden):
+        """Coverage, max utilization and travel burden of one solution vector of the sweep model."""
+        chosen = values > 0.5
+        counts = np.bincount(cols[chosen], minlength=len(hospitals))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            utilization = np.where(capacity > 0, (occupied + counts) / capacity, 0.0)
+        assignment = dict(zip(patients.index.to_numpy()[rows[chosen]].tolist(),
+                              hospitals.index.to_numpy()[cols[chosen]].tolist()))
+        point = {
+            'Coverage': float(weights[chosen].sum()),
+            'Max_Utilization': float(utilization.max()) if len(utilization) else 0.0,
+            'Travel_Burden': float(burden[chosen].sum()),
+            'Assigned_Patients': int(chosen.sum())
+        }
+        return point, assignment
+    
+    def pareto_sweep(self, n_points=5, utilization_levels=None, travel_levels=None, time_limit=None, mip_gap=None):
+        """Trade priority coverage against hospital load balance and travel burden.
+        
+        The three objectives are
+          Coverage        -- the usual objective, Priority_Score x _match_factor (maximized)
+          Max_Utilization -- highest (Current_Patients + assigned) / Beds_Capacity over
+                             all hospitals (minimized)
+          Travel_Burden   -- total travel minutes of the assigned patients, or the number
+                             of cross-region assignments when hospitals have no coordinates
+                             (minimized)
+        and the front is traced with the epsilon-constraint method: coverage is
+        maximized subject to Max_Utilization <= u and Travel_Burden <= t for every
+        (u, t) pair of the grid. The model is built once; between grid points only
+        right-hand sides change (each hospital's bed limit floor(u x Beds_Capacity) -
+        Current_Patients and the travel budget t), and each solve is warm-started from
+        the previous point's solution.
+        
+        utilization_levels and travel_levels default to n_points levels each between
+        the unconstrained optimum and the tightest meaningful bound (current occupancy
+        for utilization, zero for travel). Dominated and duplicate points are dropped;
+        the returned DataFrame is the Pareto front indexed by point number, also kept
+        in self.pareto_front. Status, Solution_Status and Best_Effort describe each
+        point's solve as in _solve_with_budget, so points cut short by time_limit are
+        not mistaken for proven optima. Commit a point as the allocation with
+        apply_pareto_point.
+        """
+        if n_points < 1:
+            raise ValueError("n_points must be at least 1")
+        
+        patients = self.patients_df
+        hospitals = self.hospitals_df
+        
+        # Ensure 'Region' column exists in patients DataFrame
+        if 'Region' not in patients.columns:
+            default_region = hospitals['Region'].iloc[0] if not hospitals.empty else "Unknown"
+            patients['Region'] = default_region
+        
+        model, x, (rows, cols) = self._build_allocation_model(patients, hospitals)
+        variables = list(x.values())
+        weights = patients['Priority_Score'].to_numpy(dtype=float)[rows] * \
+            self._match_factor(patients, hospitals)[rows, cols]
+        
+        # Utilization: occupancy after assignment relative to total bed capacity
+        if 'Current_Patients' in hospitals.columns:
+            occupied = hospitals['Current_Patients'].fillna(0).to_numpy(dtype=float)
+        else:
+            occupied = np.zeros(len(hospitals))
+        if 'Beds_Capacity' in hospitals.columns:
+            capacity = hospitals['Beds_Capacity'].fillna(0).to_numpy(dtype=float)
+        else:
+            capacity = occupied + hospitals['Effective_Beds'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base_utilization = np.where(capacity > 0, occupied / capacity, 0.0)
+        
+        # Max_Utilization <= u is a per-hospital bed limit of floor(u * capacity) - occupied,
+        # kept as one constraint per hospital whose right-hand side moves with u
+        balance = {}
+        by_hospital = np.argsort(cols, kind='stable')
+        hospital_bounds = np.searchsorted(cols[by_hospital], np.arange(len(hospitals) + 1))
+        for c in range(len(hospitals)):
+            members = by_hospital[hospital_bounds[c]:hospital_bounds[c + 1]]
+            if len(members) == 0 or capacity[c] <= 0:
+                continue
+            name = f"epsilon_utilization_{c}"
+            model += pl.LpConstraint(pl.LpAffineExpression((variables[k], 1) for k in members.tolist()),
+                                     pl.LpConstraintLE, rhs=len(members), name=name)
+            balance[c] = model.constraints[name]
+        
+        travel = self._travel_minutes(patients, hospitals)
+        if travel is not None:
+            burden, burden_unit = travel[rows, cols], 'minutes'
+        else:
+            same_region = patients['Region'].to_numpy(dtype=object)[rows] == \
+                hospitals['Region'].to_numpy(dtype=object)[cols]
+            burden, burden_unit = (~same_region).astype(float), 'cross_region_assignments'
+        
+        # The travel epsilon constraint starts out slack like the utilization ones
+        unbounded = float(burden.sum()) + 1
+        model += pl.LpConstraint(pl.LpAffineExpression(zip(variables, burden.tolist())), pl.LpConstraintLE,
+                                 rhs=unbounded, name="epsilon_travel")
+        epsilon_travel = model.constraints["epsilon_travel"]
+        
+        start = time.perf_counter()
+        points, assignments, statuses = [], {}, []
+        
+        def solve(u_level, t_level, warm):
+            for c, constraint in balance.items():
+                limit = np.floor(u_level * capacity[c] + 1e-9) - occupied[c] if u_level is not None else np.inf
+                constraint.changeRHS(float(min(max(limit, 0), len(constraint))))
+            epsilon_travel.changeRHS(unbounded if t_level is None else t_level)
+            if warm is not None:
+                for var, value in zip(variables, warm.tolist()):
+                    var.setInitialValue(round(value))
+            info = self._solve_with_budget(model, time_limit, mip_gap, warm_start=warm is not None)
+            statuses.append(info['solution_status'])
+            if not info['has_solution']:
+                return None
+            values = np.fromiter((var.varValue or 0.0 for var in variables), dtype=float, count=len(variables))
+            point, assignment = self._pareto_point(patients, hospitals, values, rows, cols, weights,
+                                                   capacity, occupied, burden)
+            number = len(points)
+            points.append(dict(point, Point=number, Utilization_Limit=u_level, Travel_Limit=t_level,
+                               Status=info['status'], Solution_Status=info['solution_status'],
+                               Best_Effort=info['best_effort'], Wall_Time_s=info['wall_time_s']))
+            assignments[number] = assignment
+            return values
+        
+        # Anchor: the unconstrained optimum bounds both grids from above
+        anchor = solve(None, None, None)
+        if anchor is None:
+            raise ValueError("CBC found no solution for the unconstrained model within the time limit")
+        top = points[0]
+        if utilization_levels is None:
+            utilization_levels = np.linspace(base_utilization.max(initial=0.0), top['Max_Utilization'], n_points)
+        if travel_levels is None:
+            travel_levels = np.linspace(0.0, top['Travel_Burden'], n_points)
+        
+        # Tight to loose, so the previous point's solution stays feasible for the next one
+        for t_level in np.unique(np.asarray(travel_levels, dtype=float)).tolist():
+            warm = None
+            for u_level in np.unique(np.asarray(utilization_levels, dtype=float)).tolist():
+                values = solve(u_level, t_level, warm)
+                warm = values if values is not None else warm
+        
+        sweep = pd.DataFrame(points).set_index('Point')
+        objectives = sweep[['Coverage', 'Max_Utilization', 'Travel_Burden']].to_numpy(dtype=float)
+        # Compare with coverage negated so every objective is minimized
+        costs = objectives * np.array([-1.0, 1.0, 1.0])
+        dominated = ((costs[None, :, :] <= costs[:, None, :] + 1e-9).all(axis=2) &
+                     (costs[None, :, :] < costs[:, None, :] - 1e-9).any(axis=2)).any(axis=1)
+        front = sweep[~dominated]
+        front = front[~front[['Coverage', 'Max_Utilization', 'Travel_Burden']].round(6).duplicated()]
+        front = front.sort_values(['Coverage', 'Max_Utilization', 'Travel_Burden'], ascending=[False, True, True])
+        
+        self.pareto_front = front
+        self.pareto_assignments = {point: assignments[point] for point in front.index}
+        self.solve_info['pareto'] = {
+            'engine': 'milp',
+            'solves': len(statuses),
+            'solutions': len(sweep),
+            'front_size': len(front),
+            'travel_burden_unit': burden_unit,
+            'statuses': pd.Series(statuses).value_counts().to_dict(),
+            'best_effort_points': int(front['Best_Effort'].sum()),
+            'wall_time_s': time.perf_counter() - start,
+            'time_limit_s': time_limit,
+            'mip_gap': mip_gap
+        }
+        return front
+    
+    def apply_pareto_point(self, point):
+        """Commit one point of the last pareto_sweep front as the current allocation."""
+        if self.pareto_front is None:
+            raise ValueError("Must run pareto_sweep() first")
+        if point not in self.pareto_assignments:
+            raise ValueError(f"Unknown Pareto point {point}, expected one of {list(self.pareto_front.index)}")
+        
+        row = self.pareto_front.loc[point]
+        best_effort = bool(row['Best_Effort'])
+        mip_gap = self.solve_info['pareto']['mip_gap']
+        self.allocation_objective = float(row['Coverage'])
+        self.solve_info['allocation'] = dict(self.solve_info['pareto'], point=int(point),
+                                             objective=self.allocation_objective, status=row['Status'],
+                                             solution_status=row['Solution_Status'], best_effort=best_effort,
+                                             has_solution=True, gap=None if best_effort else (mip_gap or 0.0))
+        self.gap_check = None
+        self.assignment = dict(self.pareto_assignments[point])
+        self._reset_residual_capacity()
+        
+        self.allocation_results = self._allocation_rows(self.patients_df, self.hospitals_df, self.assignment)
+        self.allocation_results.attrs['solve_info'] = self.solve_info['allocation']
+        return self.allocation_results
+    
+    def _greedy_transport(self, supply, demand, supplier_region, hospital_region):
+        """Closed-form transport plan when shipping costs 1 within a region and 3 across.
+        
+        Every unit shipped within its region saves the same amount, so filling each
+        region's demand from its own suppliers first and only then shipping the
+        remainder across regions is optimal. Returns the supplier x hospital flow matrix.
+        """
+        supply = supply.copy()
+        demand = demand.copy()
+        flow = np.zeros((len(supply), len(demand)))
+        
+        def fill(s_idx, h_idx):
+            # North-west corner rule over the given suppliers and hospitals
+            i = j = 0
+            while i < len(s_idx) and j < len(h_idx):
+                s, h = s_idx[i], h_idx[j]
+                amount = min(supply[s], demand[h])
+                if amount > 0:
+                    flow[s, h] += amount
+                    supply[s] -= amount
+                    demand[h] -= amount
+                if supply[s] <= 0:
+                    i += 1
+                if demand[h] <= 0:
+                    j += 1
+        
+        for region in pd.unique(hospital_region):
+            fill(np.flatnonzero(supplier_region == region), np.flatnonzero(hospital_region == region))
+        fill(np.arange(len(supply)), np.arange(len(demand)))
+        return flow
+    
+    def _solve_transport(self, resource, supply, demand, cost, relax=False,
+                         time_limit=None, mip_gap=None, initial=None):
+        """Solve one resource's transportation problem with CBC.
+        
+        With relax=True the LP relaxation is solved and rounded; supplies and demands
+        are integral, so the relaxation already has an integral optimum. Returns the
+        supplier x hospital flow matrix and the solve info.
+        """
+        n_suppliers, n_hospitals = cost.shape
+        model = pl.LpProblem(f"Supplier_{resource}_Transport", pl.LpMinimize)
+        
+        category = pl.LpContinuous if relax else pl.LpInteger
+        variables = [pl.LpVariable(f"supply_{s}_{h}", lowBound=0, cat=category)
+                     for s in range(n_suppliers) for h in range(n_hospitals)]
+        
+        # Objective: Minimize transportation costs
+        model += pl.LpAffineExpression(zip(variables, cost.ravel().tolist()))
+        
+        # Constraint 1: Supplier capacity
+        for s in range(n_suppliers):
+            row = variables[s * n_hospitals:(s + 1) * n_hospitals]
+            model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in row), pl.LpConstraintLE, rhs=supply[s])
+        
+        # Constraint 2: Hospital needs
+        for h in range(n_hospitals):
+            if demand[h] > 0:
+                column = variables[h::n_hospitals]
+                model += pl.LpConstraint(pl.LpAffineExpression((v, 1) for v in column), pl.LpConstraintGE, rhs=demand[h])
+        
+        # Seed the solver with the previous supply plan
+        warm_start = initial is not None and not relax
+        if warm_start:
+            for k in np.flatnonzero(initial.ravel()):
+                variables[k].setInitialValue(initial.flat[k])
+        
+        info = self._solve_with_budget(model, time_limit, mip_gap, warm_start)
+        values = np.fromiter((v.varValue or 0.0 for v in variables), dtype=float, count=len(variables))
+        return np.rint(values).reshape(n_suppliers, n_hospitals), info
+    
+    @_phase('supplier')
+    def allocate_supplier_resources(self, method='greedy', time_limit=None, mip_gap=None, warm_start=False,
+                                    max_workers=None):
+        """Allocate supplier resources to hospitals based on need.
+        
+        Resources are independent, so each one is solved as its own transportation
+        problem. method='greedy' uses the closed-form region-first plan, which is
+        optimal for the 1 (same region) / 3 (other region) cost; 'lp' and 'milp' solve
+        each resource's LP relaxation or integer model with CBC, in parallel threads.
+        time_limit (seconds) and mip_gap bound each CBC solve, and warm_start seeds the
+        'milp' solves with the previous supply_results. When hospitals have coordinates
+        the cost follows travel time instead, and 'greedy' is replaced by 'lp'. The
+        outcome is stored in self.solve_info['supplier'].
+        """
+        if method not in SUPPLIER_METHODS:
+            raise ValueError(f"Unknown supplier method '{method}', expected one of {SUPPLIER_METHODS}")
         if self.allocation_results is None:
             raise ValueError("Must run optimize_allocation() first")
         
@@ -190,9 +1597,6 @@ class HealthcareResourceAllocator:
         if self.suppliers_df.empty:
             return pd.DataFrame()  # Return empty DataFrame if no suppliers
         
-        # Create optimization problem
-        model = pl.LpProblem("Supplier_Resource_Allocation", pl.LpMinimize)
-        
         hospitals = self.hospitals_df
         suppliers = self.suppliers_df
         
@@ -212,73 +1616,95 @@ class HealthcareResourceAllocator:
         
         # Estimate additional resources needed
         hospitals['Additional_Beds_Needed'] = hospitals['Additional_Patients']
-        hospitals['Additional_Staff_Needed'] = hospitals['Additional_Patients'] * 0.5
+        hospitals['Additional_Staff_Needed'] = hospitals['Additional_Patients'] * self.staff_per_patient
         hospitals['Additional_Medical_Kits_Needed'] = hospitals['Additional_Patients']
         
         # Check what resources are available from suppliers
-        available_resources = []
-        if 'Beds' in suppliers.columns:
-            available_resources.append('Beds')
-        if 'Staff' in suppliers.columns:
-            available_resources.append('Staff')
-        if 'Medical_Kits' in suppliers.columns:
-            available_resources.append('Medical_Kits')
+        available_resources = [r for r in SUPPLIER_RESOURCES if r in suppliers.columns]
             
         # If no resources available, return empty DataFrame
         if not available_resources:
             return pd.DataFrame()
         
-        # Create decision variables
-        # y[s,h,r] = amount of resource r from supplier s to hospital h
-        y = {}
-        for s in suppliers.index:
-            for h in hospitals.index:
-                for r in available_resources:
-                    y[s,h,r] = pl.LpVariable(f"supply_{s}_{h}_{r}", lowBound=0, cat=pl.LpInteger)
+        supplier_region = suppliers['Region'].to_numpy(dtype=object)
+        hospital_region = hospitals['Region'].to_numpy(dtype=object)
+        regional_match = supplier_region[:, None] == hospital_region[None, :]
         
         # Objective: Minimize transportation costs (approximated by distance)
-        # Assume distances are related to whether supplier and hospital are in same region
-        transportation_cost = pl.lpSum([y[s,h,r] * 
-                                     (1 if suppliers.loc[s, 'Region'] == hospitals.loc[h, 'Region'] else 3)
-                                     for s in suppliers.index 
-                                     for h in hospitals.index 
-                                     for r in available_resources])
-        model += transportation_cost
+        # Without coordinates, assume distances are related to whether supplier and hospital are in same region;
+        # with them, cost grows from 1 next door to 3 far away
+        travel = self._travel_minutes(suppliers, hospitals)
+        if travel is None:
+            cost = np.where(regional_match, 1.0, 3.0)
+        else:
+            cost = 1.0 + 2.0 * (1.0 - np.exp(-travel / self.travel_time_scale))
+            if method == 'greedy':
+                # The region-first plan is only optimal for the 1/3 region cost
+                print("Warning: Supplier travel costs need the 'lp' method, using it instead of 'greedy'")
+                method = 'lp'
         
-        # Constraint 1: Supplier capacity
-        for s in suppliers.index:
+        supplier_ids = suppliers['Supplier_ID'].to_numpy(dtype=object) if 'Supplier_ID' in suppliers.columns else \
+            np.array([f"Supplier_{s}" for s in suppliers.index], dtype=object)
+        hospital_names = hospitals['Name'].to_numpy(dtype=object)
+        
+        # Integral shipments have to cover fractional needs (staff_per_patient is usually 0.5)
+        supplies = {r: np.floor(np.nan_to_num(suppliers[r].to_numpy(dtype=float))) for r in available_resources}
+        demands = {r: np.ceil(np.nan_to_num(hospitals[f'Additional_{r}_Needed'].to_numpy(dtype=float)))
+                   for r in available_resources}
+        
+        # Previous plan per resource, for warm starts
+        initial = dict.fromkeys(available_resources)
+        if warm_start and method == 'milp' and self.supply_results is not None and not self.supply_results.empty:
+            previous = self.supply_results
+            s_pos = pd.Index(supplier_ids).get_indexer(previous['Supplier_ID'])
+            h_pos = pd.Index(hospital_names).get_indexer(previous['Hospital'])
             for r in available_resources:
-                model += pl.lpSum([y[s,h,r] for h in hospitals.index]) <= suppliers.loc[s, r]
+                keep = (previous['Resource'] == r).to_numpy() & (s_pos >= 0) & (h_pos >= 0)
+                initial[r] = np.zeros(cost.shape)
+                initial[r][s_pos[keep], h_pos[keep]] = previous['Amount'].to_numpy(dtype=float)[keep]
         
-        # Constraint 2: Hospital needs
-        for h in hospitals.index:
-            if 'Beds' in available_resources:
-                model += pl.lpSum([y[s,h,'Beds'] for s in suppliers.index]) >= hospitals.loc[h, 'Additional_Beds_Needed']
-            if 'Staff' in available_resources:
-                model += pl.lpSum([y[s,h,'Staff'] for s in suppliers.index]) >= hospitals.loc[h, 'Additional_Staff_Needed']
-            if 'Medical_Kits' in available_resources:
-                model += pl.lpSum([y[s,h,'Medical_Kits'] for s in suppliers.index]) >= hospitals.loc[h, 'Additional_Medical_Kits_Needed']
+        start = time.perf_counter()
+        if method == 'greedy':
+            flows = {r: self._greedy_transport(supplies[r], demands[r], supplier_region, hospital_region)
+                     for r in available_resources}
+            infos = {}
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers or len(available_resources)) as pool:
+                futures = {r: pool.submit(self._solve_transport, r, supplies[r], demands[r], cost,
+                                          method == 'lp', time_limit, mip_gap, initial[r])
+                           for r in available_resources}
+                solved = {r: future.result() for r, future in futures.items()}
+            flows = {r: flow for r, (flow, _) in solved.items()}
+            infos = {r: info for r, (_, info) in solved.items()}
         
-        # Solve the model
-        model.solve(pl.PULP_CBC_CMD(msg=False))
-        
-        # Extract results
-        supply_results = []
-        for s in suppliers.index:
-            for h in hospitals.index:
-                for r in available_resources:
-                    if pl.value(y[s,h,r]) > 0:
-                        supply_results.append({
-                            'Supplier_ID': suppliers.loc[s, 'Supplier_ID'] if 'Supplier_ID' in suppliers.columns else f"Supplier_{s}",
-                            'Hospital': hospitals.loc[h, 'Name'],
-                            'Resource': r,
-                            'Amount': pl.value(y[s,h,r]),
-                            'Is_Regional_Match': suppliers.loc[s, 'Region'] == hospitals.loc[h, 'Region']
-                        })
-        
-        self.supply_results = pd.DataFrame(supply_results)
+        objective = float(sum((flows[r] * cost).sum() for r in available_resources))
+        unmet = {r: float(np.maximum(demands[r] - flows[r].sum(axis=0), 0).sum()) for r in available_resources}
+        best_effort = any(info['best_effort'] for info in infos.values())
+        self.solve_info['supplier'] = {
+            'status': 'Infeasible' if any(unmet.values()) else 'Optimal',
+            'best_effort': best_effort,
+            'gap': None if best_effort else max([info['gap'] for info in infos.values()], default=0.0),
+            'objective': objective,
+            'wall_time_s': time.perf_counter() - start,
+            'method': method,
+            'unmet_demand': unmet,
+            'resources': infos
+        }
+        
+        # Extract results in supplier, hospital, resource order
+        stacked = np.stack([flows[r] for r in available_resources], axis=-1)
+        s_idx, h_idx, r_idx = np.nonzero(stacked > 0)
+        self.supply_results = pd.DataFrame({
+            'Supplier_ID': supplier_ids[s_idx],
+            'Hospital': hospital_names[h_idx],
+            'Resource': np.array(available_resources, dtype=object)[r_idx],
+            'Amount': stacked[s_idx, h_idx, r_idx],
+            'Is_Regional_Match': regional_match[s_idx, h_idx]
+        })
+        self.supply_results.attrs['solve_info'] = self.solve_info['supplier']
         return self.supply_results
     
+    @_phase('report')
     def generate_reports(self):
         """Generate summary reports of the allocation results."""
         if self.allocation_results is None:
@@ -295,7 +1721,7 @@ class HealthcareResourceAllocator:
         
         # Add MEWS stats if available
         if 'MEWS_Score' in self.allocation_results.columns:
-            patient_summary['High_MEWS_Patients'] = sum(self.allocation_results['MEWS_Score'] >= 5)
+            patient_summary['High_MEWS_Patients'] = sum(self.allocation_results['MEWS_Score'] >= self.critical_mews)
         
         # Hospital utilization
         hospital_counts = self.allocation_results['Assigned_Hospital'].value_counts().to_dict()
@@ -357,132 +1783,411 @@ class HealthcareResourceAllocator:
     
     def create_patient_json(self):
         """Create JSON representation of patients with required fields."""
+        return self.create_patient_frame().to_dict('records')
+    
+    @_phase('extract')
+    def create_patient_frame(self, results=None):
+        """Build the patient records of create_patient_json as a DataFrame.
+        
+        Hospital and status columns stay categorical and the frame keeps the
+        allocation_results index; records are only materialized by
+        create_patient_json or an exporter. results restricts the frame to those
+        allocation_results rows, in their order (used to export in chunks).
+        
+        Allocation rows are joined to the original patient records in one pass: by
+        the first matching 'Patient ID', falling back to the row label for integer
+        IDs. Rows without a matching patient record are left out.
+        """
         if self.allocation_results is None:
             raise ValueError("Must run optimize_allocation() first")
         
-        patients_json = []
+        if results is None:
+            results = self.allocation_results
+        patients = self.patients_df
+        patient_ids = results['Patient_ID']
         
-        for idx, row in self.allocation_results.iterrows():
-            patient_id = row['Patient_ID']
-            
-            # Find original patient data
-            patient_idx = None
-            if 'Patient ID' in self.patients_df.columns:
-                matches = self.patients_df[self.patients_df['Patient ID'] == patient_id].index
-                if len(matches) > 0:
-                    patient_idx = matches[0]
-            
-            if patient_idx is None:
-                # Try to match by index if Patient ID didn't work
-                if isinstance(patient_id, int) and patient_id < len(self.patients_df):
-                    patient_idx = patient_id
-            
-            if patient_idx is not None:
-                orig_patient = self.patients_df.loc[patient_idx]
-                
-                # Get wait time
-                wait_time = None
-                if 'Time of Arrival' in orig_patient and pd.notna(orig_patient['Time of Arrival']):
-                    arrive_time = pd.to_datetime(orig_patient['Time of Arrival'])
-                    wait_time = (datetime.now() - arrive_time).total_seconds() / 60  # in minutes
-                
-                # Extract symptoms
-                symptoms = orig_patient.get('Symptoms', orig_patient.get('Chief Complaint', 'Not recorded'))
-                
-                # Get triage priority or MEWS score for status
-                triage_priority = None
-                if 'Triage Priority' in orig_patient:
-                    triage_priority = orig_patient['Triage Priority']
-                elif 'Triage_Priority_Numeric' in orig_patient:
-                    triage_priority = orig_patient['Triage_Priority_Numeric']
-                
-                mews_score = orig_patient.get('MEWS_Score', None)
-                
-                # Determine status
-                status = self.get_patient_status(mews_score, triage_priority)
-                
-                # Get diagnosis if available
-                diagnosis = orig_patient.get('Diagnosis', orig_patient.get('Preliminary Diagnosis', 'Pending'))
-                
-                # Create patient JSON entry
-                patient_entry = {
-                    "id": str(patient_id),
-                    "name": row['Patient_Name'],
-                    "symptoms": symptoms,
-                    "waittime": int(wait_time) if wait_time is not None else "Unknown",
-                    "admission_time": orig_patient.get('Time of Arrival', "Unknown"),
-                    "diagnosis": diagnosis,
-                    "status": status,
-                    "assigned_hospital": row['Assigned_Hospital'],
-                    "mews_score": float(mews_score) if mews_score is not None else None,
-                    "triage_priority": triage_priority
-                }
-                
-                patients_json.append(patient_entry)
+        # Locate each result's original patient row (position in patients_df, -1 if none)
+        source = np.full(len(results), -1)
+        if 'Patient ID' in patients.columns:
+            ids = patients['Patient ID']
+            first = ~ids.duplicated().to_numpy()
+            found = pd.Index(ids[first]).get_indexer(patient_ids)
+            source = np.where(found >= 0, np.flatnonzero(first)[np.maximum(found, 0)], -1)
+        
+        # Try to match by index if Patient ID didn't work
+        missing = source < 0
+        if missing.any():
+            numeric = pd.to_numeric(patient_ids[missing], errors='coerce')
+            by_label = numeric.notna() & (numeric % 1 == 0) & (numeric < len(patients))
+            labels = numeric[by_label].astype(int)
+            positions = np.flatnonzero(missing)[by_label.to_numpy()]
+            source[positions] = patients.index.get_indexer(labels)
+        
+        keep = source >= 0
+        results = results[keep]
+        orig = patients.iloc[source[keep]]
+        
+        # Wait time in minutes from the arrival timestamp
+        waittime = np.full(len(orig), "Unknown", dtype=object)
+        if 'Time of Arrival' in orig.columns:
+            waittime = _wait_minutes(orig['Time of Arrival'])
+        
+        def column_or(*names, default):
+            # First available column, or a constant default
+            for name in names:
+                if name in orig.columns:
+                    return orig[name].to_numpy()
+            return np.full(len(orig), default, dtype=object)
+        
+        symptoms = column_or('Symptoms', 'Chief Complaint', default='Not recorded')
+        diagnosis = column_or('Diagnosis', 'Preliminary Diagnosis', default='Pending')
+        admission_time = column_or('Time of Arrival', default='Unknown')
+        triage_priority = column_or('Triage Priority', 'Triage_Priority_Numeric', default=None)
+        
+        # Determine status from MEWS score, or from triage priority without one
+        if 'MEWS_Score' in orig.columns:
+            mews_score = orig['MEWS_Score'].to_numpy(dtype=float)
+            status = pd.Categorical(np.select([mews_score >= 7, mews_score >= 5, mews_score >= 3],
+                                              ["Critical", "Urgent", "Semi-Urgent"], default="Stable"))
+            mews_score = mews_score.astype(object)
+        else:
+            mews_score = np.full(len(orig), None, dtype=object)
+            if 'Triage Priority' in orig.columns or 'Triage_Priority_Numeric' in orig.columns:
+                triage = pd.Series(triage_priority)
+                status = pd.Categorical(np.select([triage.isin([1, 'Immediate', 'Emergency']),
+                                                   triage.isin([2, 'Urgent']),
+                                                   triage.isin([3, 'Semi-urgent'])],
+                                                  ["Critical", "Urgent", "Semi-Urgent"], default="Routine"))
+            else:
+                status = np.full(len(orig), "Unknown", dtype=object)
+        
+        patients_json = pd.DataFrame({
+            "id": results['Patient_ID'].astype(str).to_numpy(),
+            "name": results['Patient_Name'].to_numpy(),
+            "symptoms": symptoms,
+            "waittime": waittime,
+            "admission_time": admission_time,
+            "diagnosis": diagnosis,
+            "status": status,
+            "assigned_hospital": results['Assigned_Hospital'].array,
+            "mews_score": mews_score,
+            "triage_priority": triage_priority
+        }, index=results.index)
         
         return patients_json
     
-    def update_csv_files(self, patients_json):
-        """Update the CSV files with allocation results."""
+    @_phase('writeback')
+    def update_csv_files(self, patients_json, writeback='csv'):
+        """Update the CSV files with allocation results.
+        
+        patients_json may be the records of create_patient_json or the DataFrame of
+        create_patient_frame. Assignments are joined back onto patients_df by Patient
+        ID in one vectorized pass. writeback='csv' rewrites the patients file in full (in its own format);
+        writeback='changelog' only appends the patient rows that changed, and patients
+        added since the file was written, to the change log next to it (see
+        apply_change_log/compact_change_log). The hospitals file gets
+        the loaded Current_Patients / Beds_Available adjusted by the current assignment;
+        hospitals_df itself keeps the loaded values, so repeated calls are idempotent.
+        Files are only rewritten when something changed. Returns the number of patient
+        rows that changed.
+        """
+        if writeback not in WRITEBACK_MODES:
+            raise ValueError(f"Unknown writeback mode '{writeback}', expected one of {WRITEBACK_MODES}")
+        if writeback == 'csv' and self.patient_columns is not None:
+            raise ValueError("Patients were loaded with patient_columns; use writeback='changelog'")
+        
         # Update patients CSV with assignments
-        for patient in patients_json:
-            patient_id = patient['id']
+        changed = np.zeros(len(self.patients_df), dtype=bool)
+        if 'Patient ID' in self.patients_df.columns and len(patients_json) > 0:
+            # Later entries win, as they did when entries were applied one by one
+            updates = pd.DataFrame(patients_json, columns=['id', 'assigned_hospital', 'status', 'diagnosis'])
+            updates = updates.drop_duplicates('id', keep='last').set_index('id')
             
-            # Find the patient in the dataframe
+            rows = updates.index.get_indexer(self.patients_df['Patient ID'].astype(str))
+            hit = rows >= 0
+            before = self.patients_df.reindex(columns=CHANGE_LOG_COLUMNS[1:]).copy()
+            _writable_columns(self.patients_df, CHANGE_LOG_COLUMNS[1:])
+            
+            # Update patient information
+            self.patients_df.loc[hit, 'Assigned_Hospital'] = updates['assigned_hospital'].to_numpy()[rows[hit]]
+            self.patients_df.loc[hit, 'Status'] = updates['status'].to_numpy()[rows[hit]]
+            
+            # Update diagnosis if it was 'Pending'
+            if 'Diagnosis' in self.patients_df.columns:
+                diagnosis = self.patients_df['Diagnosis']
+                pending = hit & (diagnosis.isna() | (diagnosis == 'Pending')).to_numpy()
+                self.patients_df.loc[pending, 'Diagnosis'] = updates['diagnosis'].to_numpy()[rows[pending]]
+            
+            after = self.patients_df.reindex(columns=CHANGE_LOG_COLUMNS[1:])
+            changed = ~((before == after) | (before.isna() & after.isna())).all(axis=1).to_numpy()
+            if changed.any():
+                self._export_frames = {}
+        
+        # Save updated CSVs
+        if writeback == 'changelog':
+            # Patients the store does not hold yet are logged as inserts, changed or not
+            inserted = np.zeros(len(self.patients_df), dtype=bool)
             if 'Patient ID' in self.patients_df.columns:
-                mask = self.patients_df['Patient ID'].astype(str) == str(patient_id)
-                if mask.any():
-                    # Update patient information
-                    self.patients_df.loc[mask, 'Assigned_Hospital'] = patient['assigned_hospital']
-                    self.patients_df.loc[mask, 'Status'] = patient['status']
-                    
-                    # Update diagnosis if it was 'Pending'
-                    if 'Diagnosis' in self.patients_df.columns:
-                        if pd.isna(self.patients_df.loc[mask, 'Diagnosis']).any() or self.patients_df.loc[mask, 'Diagnosis'].iloc[0] == 'Pending':
-                            self.patients_df.loc[mask, 'Diagnosis'] = patient['diagnosis']
+                inserted = ~pd.Index(self._patient_ids()).isin(self._stored_patient_ids)
+            self._append_change_log(self.patients_df.loc[changed | inserted], inserted[changed | inserted])
+            self._stored_patient_ids.update(self._patient_ids()[inserted])
+        elif changed.any() or set(self._patient_ids()) != self._stored_patient_ids:
+            write_table(self.patients_df, self.patients_file)
+            self._stored_patient_ids = set(self._patient_ids())
         
         # Update hospitals CSV with new patient counts
         if 'Name' in self.hospitals_df.columns:
             hospital_counts = self.allocation_results['Assigned_Hospital'].value_counts()
+            hospital_counts = hospital_counts.drop('Unassigned', errors='ignore')
+            added = self.hospitals_df['Name'].map(hospital_counts).fillna(0).astype(float)
             
-            for hospital_name, count in hospital_counts.items():
-                if hospital_name != 'Unassigned':
-                    mask = self.hospitals_df['Name'] == hospital_name
-                    if mask.any():
-                        # Update patient counts
-                        if 'Current_Patients' in self.hospitals_df.columns:
-                            self.hospitals_df.loc[mask, 'Current_Patients'] += count
-                        else:
-                            self.hospitals_df.loc[mask, 'Current_Patients'] = count
-                        
-                        # Update available beds
-                        if 'Beds_Available' in self.hospitals_df.columns:
-                            self.hospitals_df.loc[mask, 'Beds_Available'] -= count
-                            # Ensure no negative values
-                            self.hospitals_df.loc[self.hospitals_df['Beds_Available'] < 0, 'Beds_Available'] = 0
+            # The file holds the loaded counts plus the current assignment, so persisting
+            # again recomputes the same values instead of adding the patients twice
+            if not added.equals(self._persisted_hospital_counts):
+                hospitals = self.hospitals_df.copy()
+                
+                # Update patient counts
+                if 'Current_Patients' in hospitals.columns:
+                    hospitals['Current_Patients'] += added.astype(hospitals['Current_Patients'].dtype)
+                else:
+                    hospitals['Current_Patients'] = added
+                
+                # Update available beds, ensuring no negative values
+                if 'Beds_Available' in hospitals.columns:
+                    hospitals['Beds_Available'] = (hospitals['Beds_Available'] -
+                                                   added.astype(hospitals['Beds_Available'].dtype)).clip(lower=0)
+                
+                write_table(hospitals, self.hospitals_file)
+                self._persisted_hospital_counts = added
         
-        # Save updated CSVs
-        self.patients_df.to_csv(self.patients_file, index=False)
-        self.hospitals_df.to_csv(self.hospitals_file, index=False)
+        return int(changed.sum())
+    
+    def _patient_ids(self):
+        """Patient IDs of patients_df as strings (empty without a 'Patient ID' column)."""
+        if 'Patient ID' not in self.patients_df.columns:
+            return np.array([], dtype=object)
+        return self.patients_df['Patient ID'].astype(str).to_numpy()
+    
+    def _append_change_log(self, changed_patients, inserted=None):
+        """Append changed patient rows to the append-only change log.
+        
+        Rows flagged in inserted get their full record (in the stored columns) so
+        apply_change_log can recreate them.
+        """
+        if changed_patients.empty:
+            return
         
-        return True
+        entries = changed_patients.reindex(columns=CHANGE_LOG_COLUMNS)
+        entries['Updated_At'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entries[CHANGE_LOG_RECORD] = None
+        if inserted is not None and inserted.any():
+            rows = changed_patients[inserted].reindex(columns=self._stored_columns)
+            rows = rows.astype(object).where(rows.notna(), None)
+            entries.loc[inserted, CHANGE_LOG_RECORD] = [json.dumps(record, default=str)
+                                                        for record in rows.to_dict('records')]
+        
+        if os.path.exists(self.change_log_file):
+            with open(self.change_log_file) as f:
+                header = f.readline()
+            if CHANGE_LOG_RECORD not in header.rstrip('\n').split(','):
+                # Log written before inserts were recorded: add the empty column once
+                log = pd.read_csv(self.change_log_file, dtype=str)
+                log[CHANGE_LOG_RECORD] = None
+                log.to_csv(self.change_log_file, index=False)
+        entries.to_csv(self.change_log_file, mode='a', index=False,
+                       header=not os.path.exists(self.change_log_file))
+    
+    def apply_change_log(self):
+        """Replay the change log onto patients_df, last entry per Patient ID winning.
+        
+        Patients the log recorded in full (added after the patients file was written)
+        are inserted first, then every entry's Assigned_Hospital, Status and
+        Diagnosis is applied. Returns the number of patients updated.
+        """
+        if not os.path.exists(self.change_log_file) or 'Patient ID' not in self.patients_df.columns:
+            return 0
+        
+        # All logged values are labels; an all-empty column would otherwise be read as float
+        log = pd.read_csv(self.change_log_file, dtype={col: str for col in CHANGE_LOG_COLUMNS + [CHANGE_LOG_RECORD]})
+        if CHANGE_LOG_RECORD in log.columns:
+            inserts = log[log[CHANGE_LOG_RECORD].notna() & ~log['Patient ID'].isin(self._patient_ids())]
+            inserts = inserts.drop_duplicates('Patient ID', keep='last')
+            if len(inserts) > 0:
+                self._insert_logged_patients(inserts[CHANGE_LOG_RECORD])
+        
+        log = log.drop_duplicates('Patient ID', keep='last').set_index('Patient ID')
+        rows = log.index.get_indexer(self._patient_ids())
+        hit = rows >= 0
+        _writable_columns(self.patients_df, CHANGE_LOG_COLUMNS[1:])
+        for col in CHANGE_LOG_COLUMNS[1:]:
+            if col in self.patients_df.columns or log[col].notna().any():
+                self.patients_df.loc[hit, col] = log[col].to_numpy()[rows[hit]]
+        self._export_frames = {}
+        return int(hit.sum())
     
-    def save_json_output(self, output_file="patients_allocation.json"):
-        """Save patient data to a JSON file."""
-        patients_json = self.create_patient_json()
+    def _insert_logged_patients(self, records):
+        """Append patients recorded in full in the change log to patients_df."""
+        inserted = pd.DataFrame([json.loads(record) for record in records], columns=self._stored_columns)
+        
+        # JSON holds timestamps as strings; convert them (and numbers) back to the stored
+        # column's type unless that would lose values, e.g. text IDs in a numeric column
+        for col in inserted.columns:
+            kind = self.patients_df[col].dtype.kind
+            if kind == 'M':
+                converted = pd.to_datetime(inserted[col], errors='coerce')
+            elif kind in 'iuf':
+                converted = pd.to_numeric(inserted[col], errors='coerce')
+            else:
+                continue
+            if not (converted.isna() & inserted[col].notna()).any():
+                inserted[col] = converted
+        
+        start = self.patients_df.index.max() + 1 if len(self.patients_df) > 0 else 0
+        inserted.index = pd.RangeIndex(start, start + len(inserted))
+        self.patients_df = pd.concat([self.patients_df, inserted])
+        self._stored_patient_ids.update(inserted['Patient ID'].astype(str))
+    
+    def compact_change_log(self):
+        """Fold the change log into the patients file with one full rewrite and remove it."""
+        if self.patient_columns is not None:
+            raise ValueError("Patients were loaded with patient_columns; cannot rewrite the full patients file")
+        write_table(self.patients_df, self.patients_file)
+        self._stored_patient_ids = set(self._patient_ids())
+        if os.path.exists(self.change_log_file):
+            os.remove(self.change_log_file)
+    
+    def _export_order(self, results, sort_by):
+        """Positions of results rows, most urgent first.
+        
+        sort_by='priority' orders by Priority_Score; 'hospital' groups by assigned
+        hospital (unassigned last) and orders by Priority_Score within each.
+        """
+        if sort_by not in EXPORT_SORTS:
+            raise ValueError(f"Unknown sort '{sort_by}', expected one of {EXPORT_SORTS}")
+        
+        priority = np.nan_to_num(results['Priority_Score'].to_numpy(dtype=float), nan=-np.inf)
+        if sort_by == 'hospital':
+            assigned = results['Assigned_Hospital']
+            if isinstance(assigned.dtype, pd.CategoricalDtype):
+                # Category order follows hospitals_df, with 'Unassigned' last
+                hospital_key = assigned.cat.codes.to_numpy()
+            else:
+                hospital_key = pd.factorize(assigned.where(assigned != 'Unassigned'), sort=True)[0]
+                hospital_key = np.where(hospital_key < 0, hospital_key.max() + 1, hospital_key)
+            return np.lexsort((-priority, hospital_key))
+        return np.argsort(-priority, kind='stable')
+    
+    def _sorted_patient_frame(self, sort_by='priority', hospital=None):
+        """create_patient_frame rows in _export_order, optionally for one hospital only.
+        
+        Frames are cached until allocation_results or patients_df is replaced or the
+        write-back changes patients_df, so paging does not rebuild and re-sort them.
+        """
+        if sort_by not in EXPORT_SORTS:
+            raise ValueError(f"Unknown sort '{sort_by}', expected one of {EXPORT_SORTS}")
+        if self.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
+        
+        source = self._export_source
+        if source is None or source[0] is not self.allocation_results or source[1] is not self.patients_df:
+            self._export_frames = {}
+            self._export_source = (self.allocation_results, self.patients_df)
+        
+        key = (sort_by, hospital)
+        if key not in self._export_frames:
+            if hospital is None:
+                results = self.allocation_results
+                frame = self.create_patient_frame(results.iloc[self._export_order(results, sort_by)])
+            else:
+                # Both orders are stable, so filtering the sorted frame keeps its order
+                frame = self._sorted_patient_frame(sort_by)
+                frame = frame[frame['assigned_hospital'] == hospital]
+            self._export_frames[key] = frame
+        return self._export_frames[key]
+    
+    def export_patients_page(self, page=0, page_size=50, sort_by='priority', hospital=None):
+        """Return one page of patient records in urgency order, plus the total count.
+        
+        Only the requested page is turned into dicts, so the first N most urgent
+        patients can be served without materializing the whole list. Wait times are
+        recomputed for the page, as the sorted frame is cached between calls.
+        """
+        if page < 0 or page_size < 1:
+            raise ValueError("page must be >= 0 and page_size >= 1")
+        frame = self._sorted_patient_frame(sort_by, hospital)
+        start = page * page_size
+        rows = frame.iloc[start:start + page_size]
+        if 'Time of Arrival' in self.patients_df.columns:
+            rows = rows.assign(waittime=_wait_minutes(rows['admission_time']))
+        return {
+            'page': page,
+            'page_size': page_size,
+            'total': len(frame),
+            'patients': rows.to_dict('records')
+        }
+    
+    @_phase('writeback')
+    def export_patients_ndjson(self, output_file="patients_allocation.ndjson", sort_by=None, chunk_size=10000):
+        """Stream patient records to a newline-delimited JSON file, one record per line.
+        
+        allocation_results is walked chunk_size rows at a time; each chunk's patient
+        frame is built, materialized and encoded (with orjson when available) before
+        the next, so memory stays flat as the patient count grows. sort_by
+        ('priority' or 'hospital') writes the most urgent patients first. Returns the
+        number of records written.
+        """
+        if self.allocation_results is None:
+            raise ValueError("Must run optimize_allocation() first")
+        results = self.allocation_results
+        if sort_by is not None:
+            results = results.iloc[self._export_order(results, sort_by)]
+        encode = _json_encoder()
+        
+        # Write to a temporary file first so readers never see a partial export
+        written = 0
+        temp_file = f"{output_file}.tmp"
+        with open(temp_file, 'wb') as f:
+            for start in range(0, len(results), chunk_size):
+                frame = self.create_patient_frame(results.iloc[start:start + chunk_size])
+                f.writelines(encode(record) for record in _frame_records(frame))
+                written += len(frame)
+        os.replace(temp_file, output_file)
+        return written
+    
+    @_phase('writeback')
+    def save_json_output(self, output_file="patients_allocation.json", patients_json=None):
+        """Save patient data to a JSON file (streamed as NDJSON for a .ndjson file name)."""
+        if output_file.endswith('.ndjson'):
+            self.export_patients_ndjson(output_file)
+            return output_file
+        
+        if patients_json is None:
+            patients_json = self.create_patient_json()
         
         with open(output_file, 'w') as f:
             json.dump(patients_json, f, indent=2, default=str)
         
         return output_file
     
-    def run_full_allocation(self, update_csv=True, save_json=True, json_file="patients_allocation.json"):
-        """Run the complete allocation process and return results."""
+    def run_full_allocation(self, update_csv=True, save_json=True, json_file="patients_allocation.json",
+                            engine='milp', time_limit=None, mip_gap=None, warm_start=False, writeback='csv',
+                            supplier_method='greedy', decompose=False):
+        """Run the complete allocation process and return results.
+        
+        time_limit and mip_gap apply to each solve; the solver status, gap and wall
+        time of both solves are returned under 'solver'. supplier_method selects how
+        supplier shipments are planned (see allocate_supplier_resources). When the
+        allocator was created with instrument=True, get_metrics() is returned under
+        'metrics'.
+        """
         # Run optimization
-        patient_allocation = self.optimize_allocation()
+        self.solve_info = {}
+        patient_allocation = self.optimize_allocation(engine=engine, time_limit=time_limit, mip_gap=mip_gap,
+                                                      warm_start=warm_start, decompose=decompose)
         
         try:
-            supplier_allocation = self.allocate_supplier_resources()
+            supplier_allocation = self.allocate_supplier_resources(method=supplier_method, time_limit=time_limit,
+                                                                   mip_gap=mip_gap, warm_start=warm_start)
         except Exception as e:
             print(f"Warning: Supplier allocation failed with error: {e}")
             supplier_allocation = pd.DataFrame()
@@ -490,21 +2195,24 @@ class HealthcareResourceAllocator:
         reports = self.generate_reports()
         
         # Create patient JSON
-        patients_json = self.create_patient_json()
+        patients_frame = self.create_patient_frame()
+        patients_json = patients_frame.to_dict('records')
         
         # Update CSV files if requested
         if update_csv:
-            self.update_csv_files(patients_json)
+            self.update_csv_files(patients_frame, writeback=writeback)
         
         # Save JSON output if requested
         if save_json:
-            self.save_json_output(json_file)
+            self.save_json_output(json_file, patients_json)
             
         return {
             'patient_allocation': patient_allocation,
             'supplier_allocation': supplier_allocation,
             'reports': reports,
-            'patients_json': patients_json
+            'patients_json': patients_json,
+            'solver': self.solve_info,
+            'metrics': self.get_metrics() if self.instrument else None
         }
 
 
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_benchmark import write_synthetic_data
+from resource_alloc import HealthcareResourceAllocator
+
+
+def _allocator(tmp_path, n_patients, n_hospitals, coordinates=False):
+    files = write_synthetic_data(n_patients, n_hospitals, directory=str(tmp_path))
+    if coordinates:
+        rng = np.random.default_rng(0)
+        for path in files:
+            df = pd.read_csv(path)
+            df['Latitude'] = 40 + rng.random(len(df))
+            df['Longitude'] = -74 + rng.random(len(df))
+            df.to_csv(path, index=False)
+    return HealthcareResourceAllocator(*files)
+
+
+def _beds_used(allocator):
+    assigned = pd.Series(allocator.assignment, dtype=object)
+    return assigned.value_counts().reindex(allocator.hospitals_df.index, fill_value=0)
+
+
+@pytest.mark.parametrize('n_patients, n_hospitals', [(150, 5), (400, 8)])
+def test_flow_engine_matches_milp_objective(tmp_path, n_patients, n_hospitals):
+    allocator = _allocator(tmp_path, n_patients, n_hospitals)
+    allocator.optimize_allocation(engine='milp')
+    milp_objective, milp_assigned = allocator.allocation_objective, len(allocator.assignment)
+
+    allocator.optimize_allocation(engine='flow')
+    assert allocator.allocation_objective == pytest.approx(milp_objective, rel=1e-9)
+    assert len(allocator.assignment) == milp_assigned
+    assert (_beds_used(allocator) <= allocator.hospitals_df['Effective_Beds']).all()
+
+
+def test_decomposed_solve_stays_close_to_milp(tmp_path):
+    allocator = _allocator(tmp_path, 400, 8)
+    allocator.optimize_allocation(engine='milp', decompose=True, max_workers=1, check_gap=True)
+
+    gap = allocator.gap_check
+    assert gap['engine_objective'] <= gap['milp_objective'] + 1e-6
+    assert gap['gap'] < 0.01
+    assert allocator.solve_info['allocation']['decomposed']
+    assert not allocator.solve_info['allocation']['best_effort']
+
+
+def test_decomposed_solve_with_coordinates_reports_gap(tmp_path, capsys):
+    allocator = _allocator(tmp_path, 400, 8, coordinates=True)
+    allocator.optimize_allocation(engine='milp', decompose=True, max_workers=1)
+
+    assert 'travel times couple the regions' in capsys.readouterr().out
+    assert allocator.gap_check is not None
+    assert allocator.gap_check['engine_objective'] <= allocator.gap_check['milp_objective'] + 1e-6
+
+
+def test_pareto_front_is_non_dominated(tmp_path):
+    allocator = _allocator(tmp_path, 150, 5)
+    front = allocator.pareto_sweep(n_points=3)
+
+    costs = front[['Coverage', 'Max_Utilization', 'Travel_Burden']].to_numpy() * np.array([-1.0, 1.0, 1.0])
+    for i in range(len(costs)):
+        for j in range(len(costs)):
+            if i != j:
+                assert not ((costs[j] <= costs[i] + 1e-9).all() and (costs[j] < costs[i] - 1e-9).any())
+
+    # The grid reaches both ends: the unconstrained optimum and zero travel
+    allocator.optimize_allocation(engine='milp')
+    assert front['Coverage'].max() == pytest.approx(allocator.allocation_objective, rel=1e-6)
+    assert front['Travel_Burden'].min() == 0
+
+    point = front.index[-1]
+    results = allocator.apply_pareto_point(point)
+    assert (results['Assigned_Hospital'] != 'Unassigned').sum() == front.loc[point, 'Assigned_Patients']
+    assert allocator.solve_info['allocation']['best_effort'] == front.loc[point, 'Best_Effort']
@@ -0,0 +1,36 @@
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import allocation_service
+from allocation_benchmark import write_synthetic_data
+
+
+def test_persisted_arrivals_survive_restart(tmp_path, monkeypatch):
+    patients_file, hospitals_file, suppliers_file = write_synthetic_data(200, 6, directory=str(tmp_path))
+    service = allocation_service.AllocationService(patients_file, hospitals_file, suppliers_file, engine='flow')
+    monkeypatch.setattr(allocation_service, 'service', service)
+    client = allocation_service.app.test_client()
+
+    arrivals = pd.read_csv(patients_file).head(3)
+    arrivals['Patient ID'] = ['ARRIVAL-1', 'ARRIVAL-2', 'ARRIVAL-3']
+    payload = json.loads(arrivals.to_json(orient='records'))
+    assert client.post('/api/allocation/arrivals', json={'patients': payload}).status_code == 200
+    assert client.post('/api/allocation/persist').get_json()['status'] == 'success'
+    expected = service.allocator.create_patient_frame().set_index('id')['assigned_hospital'].astype(str)
+
+    restarted = allocation_service.AllocationService(patients_file, hospitals_file, suppliers_file, engine='flow')
+    patients = restarted.allocator.patients_df
+    assert len(patients) == 203
+    assert set(arrivals['Patient ID']) <= set(patients['Patient ID'].astype(str))
+    stored = patients.set_index(patients['Patient ID'].astype(str))['Assigned_Hospital'].astype(str)
+    pd.testing.assert_series_equal(stored.loc[expected.index], expected, check_names=False, check_index_type=False)
+
+    # Persisting again after the restart does not log the arrivals a second time
+    restarted.persist()
+    log = pd.read_csv(f"{patients_file}.changes.csv", dtype=str)
+    assert log['Record'].notna().sum() == 3
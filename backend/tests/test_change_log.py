@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_benchmark import write_synthetic_data
+from resource_alloc import HealthcareResourceAllocator
+
+
+def _by_id(allocator, column):
+    patients = allocator.patients_df
+    return patients.set_index(patients['Patient ID'].astype(str))[column].astype(str)
+
+
+def test_change_log_replays_updates_and_inserts(tmp_path):
+    patients_file, hospitals_file, suppliers_file = write_synthetic_data(120, 4, directory=str(tmp_path))
+    allocator = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    allocator.optimize_allocation(engine='flow')
+
+    arrivals = pd.read_csv(patients_file).head(3)
+    arrivals['Patient ID'] = ['NEW-1', 'NEW-2', 'NEW-3']
+    allocator.add_patients(arrivals.to_dict('records'), engine='flow')
+    allocator.update_csv_files(allocator.create_patient_frame(), writeback='changelog')
+
+    # A later update to an inserted patient is replayed on top of its insert
+    frame = allocator.create_patient_frame()
+    frame['status'] = frame['status'].astype(object)
+    frame.loc[frame['id'] == 'NEW-2', 'status'] = 'Discharged'
+    assert allocator.update_csv_files(frame, writeback='changelog') == 1
+
+    log = pd.read_csv(allocator.change_log_file, dtype=str)
+    assert log['Record'].notna().sum() == 3
+    assert len(pd.read_csv(patients_file)) == 120
+
+    reloaded = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    assert len(reloaded.patients_df) == 123
+    assert reloaded.patients_df.index.is_unique
+    pd.testing.assert_series_equal(_by_id(reloaded, 'Assigned_Hospital'), _by_id(allocator, 'Assigned_Hospital'))
+    assert _by_id(reloaded, 'Status')['NEW-2'] == 'Discharged'
+    # Inserted rows are preprocessed like the rest
+    assert reloaded.patients_df['Priority_Score'].notna().all()
+
+    # Compacting folds the inserts into the file and removes the log
+    reloaded.compact_change_log()
+    assert not os.path.exists(reloaded.change_log_file)
+    compacted = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    assert len(compacted.patients_df) == 123
+    pd.testing.assert_series_equal(_by_id(compacted, 'Status'), _by_id(reloaded, 'Status'))
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_benchmark import write_synthetic_data
+from resource_alloc import HealthcareResourceAllocator, convert_csv_to_columnar
+
+
+def _assigned(allocator):
+    """Assigned hospital per Patient ID as persisted in patients_df."""
+    patients = allocator.patients_df.set_index(allocator.patients_df['Patient ID'].astype(str))
+    return patients['Assigned_Hospital'].astype(str)
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.arrow'])
+@pytest.mark.parametrize('writeback', ['csv', 'changelog'])
+def test_columnar_load_allocate_writeback_reload(tmp_path, extension, writeback):
+    patients_csv, hospitals_file, suppliers_file = write_synthetic_data(200, 8, directory=str(tmp_path))
+    patients_file = convert_csv_to_columnar(patients_csv, str(tmp_path / f"patients{extension}"))
+
+    allocator = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    allocator.run_full_allocation(update_csv=True, save_json=False, engine='flow', writeback=writeback)
+    expected = allocator.create_patient_frame().set_index('id')['assigned_hospital'].astype(str)
+    assert (expected != 'Unassigned').any()
+
+    reloaded = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    pd.testing.assert_series_equal(_assigned(reloaded).loc[expected.index], expected,
+                                   check_names=False, check_index_type=False)
+
+    # The change log belongs to this file only, not to the CSV it was converted from
+    assert os.path.exists(f"{patients_file}.changes.csv") == (writeback == 'changelog')
+    assert not os.path.exists(f"{patients_csv}.changes.csv")
+    csv_allocator = HealthcareResourceAllocator(patients_csv, hospitals_file, suppliers_file)
+    assert (csv_allocator.patients_df['Assigned_Hospital'] == 'Unassigned').all()
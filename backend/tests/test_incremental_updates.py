@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_benchmark import write_synthetic_data
+from resource_alloc import HealthcareResourceAllocator
+
+
+def _arrivals(patients_file, ids):
+    arrivals = pd.read_csv(patients_file).head(len(ids)).copy()
+    arrivals['Patient ID'] = ids
+    return arrivals.to_dict('records')
+
+
+def _assert_capacity_consistent(allocator):
+    """residual_capacity matches a recount from the assignment and never goes negative."""
+    tracked = allocator.residual_capacity.copy()
+    allocator._reset_residual_capacity()
+    pd.testing.assert_frame_equal(tracked, allocator.residual_capacity)
+    assert (tracked['Beds'] >= 0).all()
+    assert (tracked['Ventilators'] >= 0).all()
+
+
+@pytest.mark.parametrize('engine', ['milp', 'flow'])
+def test_add_and_discharge_keep_capacity_accounting(tmp_path, engine):
+    patients_file, hospitals_file, suppliers_file = write_synthetic_data(150, 5, directory=str(tmp_path))
+    allocator = HealthcareResourceAllocator(patients_file, hospitals_file, suppliers_file)
+    allocator.optimize_allocation(engine=engine)
+    _assert_capacity_consistent(allocator)
+
+    # Free some beds first so arrivals have somewhere to go
+    assigned = allocator.patients_df.loc[list(allocator.assignment), 'Patient ID'].head(10).tolist()
+    beds_before = allocator.residual_capacity['Beds'].sum()
+    assert allocator.discharge_patients(assigned) == 10
+    assert allocator.residual_capacity['Beds'].sum() == beds_before + 10
+    _assert_capacity_consistent(allocator)
+
+    delta = allocator.add_patients(_arrivals(patients_file, [f"A{i}" for i in range(6)]), engine=engine)
+    assert len(delta) == 6
+    assert len(allocator.allocation_results) == len(allocator.patients_df) == 146
+    placed = (delta['Assigned_Hospital'] != 'Unassigned').sum()
+    assert allocator.residual_capacity['Beds'].sum() == beds_before + 10 - placed
+    _assert_capacity_consistent(allocator)
+
+    # Reshuffling releases lower-priority patients and re-solves them with the arrivals
+    allocator.add_patients(_arrivals(patients_file, [f"B{i}" for i in range(4)]), engine=engine, max_reshuffle=5)
+    assert set(allocator.assignment) <= set(allocator.patients_df.index)
+    _assert_capacity_consistent(allocator)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Declarative normalization rules for the triage columns the allocator scores on.
+#   kind:    'numeric' coerces each value on its own; 'ordinal' additionally maps labels
+#   mapping: label -> number for ordinal columns (matched case-insensitively)
+#   range:   inclusive (low, high) bounds, None for open; values outside are invalid
+#   default: replacement for missing or invalid values (NaN keeps them missing)
+TRIAGE_NORMALIZATION = {
+    'Triage Priority': {
+        'kind': 'ordinal',
+        'mapping': {'Immediate': 1, 'Emergency': 1, 'Urgent': 2, 'Semi-urgent': 3, 'Delayed': 3,
+                    'Non-urgent': 4, 'Minor': 5},
+        'range': (1, 5),
+        'default': 3
+    },
+    'MEWS_Score': {'kind': 'numeric', 'range': (0, 14), 'default': 2},
+    'Time_Criticality_Min': {'kind': 'numeric', 'range': (0, None), 'default': 60},
+    'Derived_Severity': {'kind': 'numeric', 'range': (0, None), 'default': np.nan}
+}
+
+
+def normalize_column(values, rule):
+    """Normalize one column according to a rule from TRIAGE_NORMALIZATION.
+
+    Numbers and numeric strings are coerced per value; for ordinal columns the
+    remaining labels are looked up once per distinct value and broadcast back through
+    the factorized codes. Returns (float array, valid mask, counts) where counts holds
+    how many values were valid numbers, non-numeric labels, labels mapped to a valid
+    number, missing and invalid.
+    """
+    values = pd.Series(values)
+    numeric = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+    is_numeric = ~np.isnan(numeric)
+    missing = values.isna().to_numpy()
+
+    result = numeric.copy()
+    mapped = np.zeros(len(values), dtype=bool)
+    if rule.get('kind') == 'ordinal' and rule.get('mapping'):
+        lookup = {str(k).strip().lower(): v for k, v in rule['mapping'].items()}
+        labels = ~is_numeric & ~missing
+        codes, uniques = pd.factorize(values[labels].astype(str).str.strip().str.lower())
+        table = np.array([lookup.get(u, np.nan) for u in uniques], dtype=float)
+        label_values = table[codes] if len(table) else np.full(len(codes), np.nan)
+        result[labels] = label_values
+        mapped[labels] = ~np.isnan(label_values)
+
+    low, high = rule.get('range', (None, None))
+    valid = ~np.isnan(result)
+    if low is not None:
+        valid &= result >= low
+    if high is not None:
+        valid &= result <= high
+
+    result = np.where(valid, result, rule.get('default', np.nan))
+    counts = {
+        'rows': len(values),
+        'numeric': int((is_numeric & valid).sum()),
+        'mapped': int(mapped[valid].sum()),
+        'labels': int((~is_numeric & ~missing).sum()),
+        'missing': int(missing.sum()),
+        'invalid': int((~valid & ~missing).sum())
+    }
+    counts['defaulted'] = counts['missing'] + counts['invalid']
+    return result, valid, counts
+
+
+def normalize_triage(df, spec=None):
+    """Normalize every spec column present in df without modifying it.
+
+    Returns (values, valid, counts): a DataFrame of normalized float columns, a
+    boolean DataFrame marking which original values were usable, and per-column
+    counts (see normalize_column). Columns missing from df are skipped.
+    """
+    spec = TRIAGE_NORMALIZATION if spec is None else spec
+    values, valid, counts = {}, {}, {}
+    for col, rule in spec.items():
+        if col in df.columns:
+            values[col], valid[col], counts[col] = normalize_column(df[col], rule)
+    return pd.DataFrame(values, index=df.index), pd.DataFrame(valid, index=df.index), counts